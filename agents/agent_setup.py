@@ -1,179 +1,207 @@
-from functools import partial
-from typing import Dict, List, Optional, Type, Any
-from datetime import datetime, timedelta
-import traceback
+import asyncio
+import atexit
+import queue
+from functools import cached_property, lru_cache
+from typing import TYPE_CHECKING, AsyncIterator, Dict, FrozenSet, List, Optional, Tuple, Any
+from datetime import datetime
+import hashlib
 import logging
-from zoneinfo import ZoneInfo
+from logging.handlers import QueueHandler, QueueListener
+import os
+import time
 
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain.callbacks.base import BaseCallbackHandler
 from langchain.tools import Tool, BaseTool
-from langchain.prompts import PromptTemplate
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import SystemMessage
 
 from knowledge_base.site_knowledge import SiteKnowledge, KnowledgeSource
 from services.llm import llm_openai
-from services.calendar_service import calendar_service, CalendarServiceError
-
-from services.context_manager import context_manager    
-from agents.calendar_tools import (
-    AsyncCalendarCheckTool,
-    AsyncCalendarScheduleTool,
-    AsyncCalendarCancelTool,
-    AsyncCalendarRescheduleTool
-)
-from agents.sticker_tools import sticker_tool
-from agents.reaction_tools import reaction_tool
+from services.calendar_service import calendar_service, BRASIL_TZ
+
+from services.context_manager import current_whatsapp_number
+from utils.cache import TTLCache
+
+if TYPE_CHECKING:
+    from langchain.agents import AgentExecutor
 
 # Reduzir verbosidade de logs do LangChain
 logging.getLogger('langchain').setLevel(logging.ERROR)
 
 logger = logging.getLogger(__name__)
 
-class AgentManager:
-    """Gerencia a criação e configuração do agente."""
-    
-    def __init__(self):
-        self.site_knowledge = SiteKnowledge()
-        self.tz = ZoneInfo('America/Sao_Paulo')
-        self.whatsapp_context = {}  # Dicionário para armazenar contexto por número WhatsApp
-
-        # Inicializar componentes do agente
-        self.tools = self._create_tools()
-        self.prompt = self._create_prompt()
-        self.agent = self._create_agent()
-        self.executor = self._create_executor()
-    
-    def set_whatsapp_number(self, number: str) -> None:
-        """
-        Define o número do WhatsApp atual.
-        """
-        if not number:
-            logger.error("Tentativa de configurar número de WhatsApp vazio")
-            return
-            
-        logger.info(f"Configurando número do WhatsApp no AgentManager: {number}")
-        self.whatsapp_number = number
-        
-        # Define o contexto do WhatsApp (isso mantém a compatibilidade com o código existente)
-        if number not in self.whatsapp_context:
-            self.whatsapp_context[number] = {}
-        self.whatsapp_context["current"] = number
-        
-        # Atualiza o número em todas as ferramentas que precisem dele
-        for tool in self.tools:
-            if hasattr(tool, 'set_whatsapp_number'):
-                logger.debug(f"Configurando número {number} na ferramenta: {tool.name}")
-                tool.set_whatsapp_number(number)
+# Data e hora numa única formatação, separadas depois
+_DT_FMT = "%d/%m/%Y|%H:%M"
+
+
+@lru_cache(maxsize=1)
+def _format_now(epoch_minute: int) -> Dict[str, str]:
+    """
+    Entradas de data e hora (dd/mm/aaaa, HH:MM) do minuto informado, montadas uma
+    vez por minuto. O dicionário é compartilhado: copiar, nunca alterar.
+    """
+    current_date, current_time = datetime.fromtimestamp(epoch_minute * 60, BRASIL_TZ).strftime(_DT_FMT).split("|")
+    return {"current_date": current_date, "current_time": current_time}
+
+
+# Passos do agente só são registrados com LOG_LEVEL=DEBUG
+_AGENT_DEBUG = os.getenv("LOG_LEVEL", "WARNING").upper() in ("DEBUG", str(logging.DEBUG))
+
+# Agentes já construídos, por conjunto de ferramentas e versão do SYSTEM_PROMPT
+_AGENT_CACHE: Dict[Tuple[Tuple[str, ...], str], Any] = {}
+
+# Cumprimentos simples respondidos sem acionar o agente no primeiro contato
+_GREETING_SHORTCUTS: FrozenSet[str] = frozenset({
+    "oi", "oie", "olá", "ola", "opa", "e aí", "eai", "hello", "hi",
+    "bom dia", "boa tarde", "boa noite",
+})
+_GREETING_REPLY = "Olá! Eu sou a Livia, da Nerai.\n\nComo posso ajudar você hoje?"
+
+# Agradecimentos respondidos sem acionar o agente em qualquer ponto da conversa.
+# "ok"/"sim" ficam de fora: no meio de um agendamento podem ser uma confirmação.
+_THANKS_REPLY = "Por nada! Se precisar de algo mais, é só me chamar."
+_FAST_REPLIES: Dict[str, str] = {
+    "obrigado": _THANKS_REPLY,
+    "obrigada": _THANKS_REPLY,
+    "muito obrigado": _THANKS_REPLY,
+    "muito obrigada": _THANKS_REPLY,
+    "brigado": _THANKS_REPLY,
+    "brigada": _THANKS_REPLY,
+    "valeu": _THANKS_REPLY,
+    "obg": _THANKS_REPLY,
+}
+
+
+_ERROR_REPLY = "Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente."
+
+# Saída do AgentExecutor (early_stopping_method="force") ao atingir max_iterations
+_AGENT_STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+_STOPPED_REPLY = "Desculpe, não consegui concluir sua solicitação agora. Pode me dizer de novo o que precisa?"
+
+
+def _customer_reply(output: str) -> str:
+    """Troca a mensagem (em inglês) do executor interrompido por uma resposta ao cliente."""
+    return _STOPPED_REPLY if output == _AGENT_STOPPED_OUTPUT else output
+
+
+def _extract_output(result: Any) -> str:
+    """Extrai o texto de resposta do resultado do executor."""
+    match result:
+        case {"output": output}:
+            return output
+        # Chaves alternativas, caso o executor não devolva "output"
+        case {"response": output} | {"result": output} | {"answer": output} | {"content": output}:
+            return output
+        case str() if result:
+            return result
+        case [*_, str() as last]:
+            return last
+        case [*_, {"content": last}]:
+            return last
     
-    async def get_user_context(self, email=None, whatsapp_number=None):
-        """
-        Busca informações contextuais do usuário baseado no email ou número de WhatsApp.
-        """
-        context = {}
-        
-        # Primeiro verificar contexto local
-        if whatsapp_number and whatsapp_number in self.whatsapp_context:
-            context.update(self.whatsapp_context[whatsapp_number])
-            
-            # Se já temos attendee_id, buscar informações atualizadas
-            if context.get("attendee_id"):
-                try:
-                    attendee = await calendar_service.get_attendee(context["attendee_id"])
-                    if attendee:
-                        context["name"] = attendee.get("name")
-                        context["email"] = attendee.get("email")
-                        return context
-                except Exception as e:
-                    logger.error(f"Erro ao buscar attendee: {e}")
-        
-        return context
+    logger.warning(f"Resultado inesperado do executor: {result!r}")
+    return _ERROR_REPLY
 
-    def _create_tools(self) -> List[BaseTool]:
-        """Cria as ferramentas disponíveis para o agente."""
-        tools = [
-            Tool(
-                name="site_knowledge",
-                description="Consulta informações específicas do site nerai.com.br. Use esta ferramenta para responder perguntas sobre a empresa e seus serviços.",
-                func=self.site_knowledge.query,  # ou .search, dependendo da implementação
-            ),
-            # Ferramentas de calendário não recebem mais o whatsapp_context
-            AsyncCalendarCheckTool(),
-            AsyncCalendarScheduleTool(),
-            AsyncCalendarCancelTool(),
-            AsyncCalendarRescheduleTool(),
-            sticker_tool,  # Ferramenta de figurinhas
-            reaction_tool  # Ferramenta de reações
-        ]
-        return tools
-
-    def _create_prompt(self) -> PromptTemplate:
-        """Cria e configura o template de prompt."""
-        template = (
-            "Você é a Livia, Atendente da Nerai.\n"
-            "Data e hora atual do sistema: {current_date} às {current_time}\n\n"
-            "{system_prompt}\n\n"
-            "Histórico da Conversa:\n{history}\n\n"
-            "Solicitação Atual: {input}\n\n"
-            "Histórico de Ações:\n{agent_scratchpad}\n"
-        )
-        return PromptTemplate.from_template(template)
 
-    def _create_agent(self):
-        """Cria o agente OpenAI functions."""
-        return create_openai_functions_agent(
-            llm_openai,
-            self.tools,
-            self.prompt
-        )
+def _unwrap_dict_output(result: Any) -> str:
+    """Caminho direto para o formato padrão do AgentExecutor: {"output": ...}."""
+    try:
+        return result["output"]
+    except (KeyError, TypeError):
+        return _extract_output(result)
 
-    def _create_executor(self) -> AgentExecutor:
-        """Cria o executor do agente."""
-        return AgentExecutor(
-            agent=self.agent,
-            tools=self.tools,
-            verbose=True,
-            return_intermediate_steps=False,
-            max_iterations=10,
-            handle_tool_error=True,
-            agent_kwargs={
-                "extra_prompt_messages": []
-            },
-            output_key="output"  # Definindo a chave de saída
-        )
 
-    async def initialize(self):
-        """Inicializa a base de conhecimento."""
-        await self.site_knowledge.initialize()
-        
-    async def run(self, message: str, phone_number: str, metadata: Dict = None):
-        """
-        Executa o agente para processar uma mensagem.
-        """
-        try:
-            # Definir número atual
-            self.set_whatsapp_number(phone_number)
-            
-            # Obter data e hora atual
-            current_date = datetime.now(self.tz)
-            current_date_str = current_date.strftime("%d/%m/%Y")
-            current_time_str = current_date.strftime("%H:%M")
-            
-            # Executar o agente
-            result = await self.executor.ainvoke({
-                "input": message,
-                "history": metadata.get("history", "") if metadata else "",
-                "current_date": current_date_str,
-                "current_time": current_time_str,
-                "system_prompt": SYSTEM_PROMPT
-            })
-            
-            return result["output"]
-            
-        except Exception as e:
-            logger.error(f"Erro na preparação do agente: {e}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            return "Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente."
+# Máximo de números com contexto local em memória
+_WHATSAPP_CONTEXT_SIZE = 10_000
+_WHATSAPP_CONTEXT_TTL = 3600  # segundos sem mensagens até descartar a sessão
+
+# Participantes (attendees) do Cal.com já consultados
+_ATTENDEE_CACHE_SIZE = 10_000
+_ATTENDEE_CACHE_TTL = 300  # segundos
+
+# Turnos executados em paralelo por run_batch (respeita o limite de RPM da OpenAI)
+_BATCH_MAX_CONCURRENCY = 5
+
+
+# Tamanho máximo das mensagens do histórico enviadas ao agente
+_HISTORY_MAX_CHARS = 4000
+_HISTORY_MESSAGE_PREFIXES = ("Cliente:", "Livia:")
+
 
-SYSTEM_PROMPT = """# 1.Identidade e Personalidade
+def _prepare_history(raw: str, max_chars: int = _HISTORY_MAX_CHARS) -> str:
+    """
+    Limita o histórico às mensagens mais recentes (até `max_chars`) e normaliza espaços.
+    
+    Os blocos de contexto do início (lead, agendamento) são sempre mantidos; só as
+    mensagens antigas são descartadas. A mensagem em que cai o corte perde apenas as
+    linhas iniciais, e a última mensagem é sempre mantida, mesmo maior que o limite.
+    """
+    lines = [" ".join(line.split()) for line in raw.splitlines()]
+    first_message = next(
+        (i for i, line in enumerate(lines) if line.startswith(_HISTORY_MESSAGE_PREFIXES)),
+        len(lines)
+    )
+    header, messages = lines[:first_message], lines[first_message:]
+    
+    # Agrupar as linhas por mensagem: as de continuação ficam com a mensagem anterior
+    grouped: List[List[str]] = []
+    for line in messages:
+        if line.startswith(_HISTORY_MESSAGE_PREFIXES) or not grouped:
+            grouped.append([line])
+        else:
+            grouped[-1].append(line)
+    
+    kept: List[str] = []
+    size = 0
+    for message_lines in reversed(grouped):
+        message_size = sum(len(line) + 1 for line in message_lines)
+        if size + message_size <= max_chars:
+            kept[:0] = message_lines
+            size += message_size
+            continue
+        
+        # Mensagem cortada: manter as linhas finais, marcadas com quem falou
+        speaker = next(prefix for prefix in _HISTORY_MESSAGE_PREFIXES if message_lines[0].startswith(prefix))
+        marker = f"{speaker} [...]"
+        tail: List[str] = []
+        tail_size = len(marker) + 1
+        for line in reversed(message_lines[1:]):
+            if size + tail_size + len(line) + 1 > max_chars and (tail or kept):
+                break
+            tail.insert(0, line)
+            tail_size += len(line) + 1
+        if tail:
+            kept[:0] = [marker] + tail
+        elif not kept:
+            # Última mensagem numa linha só, maior que o limite: vai inteira
+            kept = message_lines
+        break
+    return "\n".join(header + kept)
+
+
+def _is_first_turn(history: str) -> bool:
+    """Indica se a Livia ainda não respondeu nesta conversa (e não há contexto de lead)."""
+    return "Livia:" not in history and "Contexto do Lead" not in history
+
+
+def _shortcut_reply(message: str, history: str) -> Optional[str]:
+    """
+    Resposta imediata para mensagens triviais, sem passar pelo executor.
+    
+    Returns:
+        Texto da resposta, "" para ignorar ruído, ou None para seguir o fluxo normal
+    """
+    msg = message.strip().lower().rstrip("!?.,")
+    if len(msg) < 3 and not any(char.isalnum() for char in msg):
+        return ""
+    fast_reply = _FAST_REPLIES.get(msg)
+    if fast_reply is not None:
+        return fast_reply
+    if msg in _GREETING_SHORTCUTS and _is_first_turn(history):
+        return _GREETING_REPLY
+    return None
+
+_RAW_SYSTEM_PROMPT = """# 1.Identidade e Personalidade
 Você é Livia, atendente virtual da Nerai, especialista em soluções de IA para empresas. Sua missão é qualificar leads e gerar oportunidades de negócio através de conversas naturais e estratégicas no WhatsApp.
 
 Comunique-se como um brasileiro autêntico: caloroso, profissional e claro. Explique conceitos técnicos de forma simples, como em uma conversa informal. Seja direto e sincero, mantendo um tom acolhedor.
@@ -343,12 +371,425 @@ Antes de cada mensagem, verifique:
 - Você evitou iniciar a mensagem com "Oi" ou outro cumprimento repetitivo?
 """
 
+# Prompt normalizado uma única vez: sem espaços no fim das linhas nem nas bordas
+SYSTEM_PROMPT = "\n".join(line.rstrip() for line in _RAW_SYSTEM_PROMPT.strip().splitlines())
+SYSTEM_PROMPT_HASH = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()
+
+_SYSTEM_PREFIX = "Você é a Livia, Atendente da Nerai.\n\n"
+
+# Mensagens que vêm depois das instruções fixas e variam a cada turno
+_TURN_MESSAGES = [
+    ("system", "Data e hora atual do sistema: {current_date} às {current_time}"),
+    ("human",
+     "Histórico da Conversa:\n{history}\n\n"
+     "Solicitação Atual: {input}"),
+    MessagesPlaceholder(variable_name="agent_scratchpad"),
+]
+
+# Prompt do agente em mensagens: sistema (instruções fixas), sistema (data/hora) e
+# humano (conversa), seguidos das ações já executadas. As instruções fixas vêm primeiro
+# e não mudam entre turnos, então a OpenAI cacheia esse prefixo automaticamente; o que varia a
+# cada chamada fica depois. As instruções entram como mensagem pronta (não como
+# template), então a formatação por turno só substitui os campos variáveis.
+_AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(content=_SYSTEM_PREFIX + SYSTEM_PROMPT),
+    *_TURN_MESSAGES,
+])
+
+# Base de conhecimento do site: uma só por processo (carrega o modelo de embeddings)
+_SITE_KNOWLEDGE: Optional[SiteKnowledge] = None
+
+
+def _get_site_knowledge() -> SiteKnowledge:
+    """Retorna a base de conhecimento compartilhada, criando-a no primeiro uso."""
+    global _SITE_KNOWLEDGE
+    if _SITE_KNOWLEDGE is None:
+        _SITE_KNOWLEDGE = SiteKnowledge()
+    return _SITE_KNOWLEDGE
+
+
+def _query_site(question: str) -> str:
+    """Consulta diretamente a base do site, sem percorrer todas as fontes."""
+    return _get_site_knowledge().query(question, source=KnowledgeSource.WEBSITE)
+
+
+async def _aquery_site(question: str) -> str:
+    """Versão assíncrona de `_query_site`, aguardada diretamente pelo executor."""
+    return await _get_site_knowledge().aquery(question, source=KnowledgeSource.WEBSITE)
+
+
+# Ferramenta do site construída uma única vez, na importação
+_SITE_KB_TOOL = Tool(
+    name="site_knowledge",
+    description="Consulta informações específicas do site nerai.com.br. Use esta ferramenta para responder perguntas sobre a empresa e seus serviços.",
+    func=_query_site,
+    coroutine=_aquery_site,
+)
+
+
+@lru_cache(maxsize=1)
+def _build_tools() -> Tuple[BaseTool, ...]:
+    """
+    Ferramentas do agente, construídas uma vez por processo: não guardam estado
+    da conversa (o número atendido vem do contextvar), então são compartilháveis.
+    """
+    from agents.calendar_tools import (
+        AsyncCalendarCheckTool,
+        AsyncCalendarScheduleTool,
+        AsyncCalendarCancelTool,
+        AsyncCalendarRescheduleTool
+    )
+    from agents.sticker_tools import sticker_tool
+    from agents.reaction_tools import reaction_tool
+    
+    tools = [
+        _SITE_KB_TOOL,
+        # Ferramentas de calendário não recebem mais o whatsapp_context
+        AsyncCalendarCheckTool(),
+        AsyncCalendarScheduleTool(),
+        AsyncCalendarCancelTool(),
+        AsyncCalendarRescheduleTool(),
+        sticker_tool,  # Ferramenta de figurinhas
+        reaction_tool  # Ferramenta de reações
+    ]
+    # Ordem estável: os schemas das funções serializados ficam idênticos entre chamadas
+    return tuple(sorted(tools, key=lambda tool: tool.name))
+
+
+class _ForwardHandler(logging.Handler):
+    """Repassa registros da fila ao logger do módulo (e seus handlers)."""
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        logger.handle(record)
+
+
+# Logger dos passos do agente, criado só quando o debug está ativo
+_STEP_LOGGER: Optional[logging.Logger] = None
+
+
+def _get_step_logger() -> logging.Logger:
+    """
+    Logger dos passos do agente: os registros entram numa fila e são gravados
+    por uma thread à parte, sem bloquear o event loop com I/O de log.
+    """
+    global _STEP_LOGGER
+    if _STEP_LOGGER is None:
+        step_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        step_logger = logging.getLogger(f"{__name__}.steps")
+        step_logger.propagate = False
+        step_logger.addHandler(QueueHandler(step_queue))
+        listener = QueueListener(step_queue, _ForwardHandler())
+        listener.start()
+        atexit.register(listener.stop)
+        _STEP_LOGGER = step_logger
+    return _STEP_LOGGER
+
+
+class _LoggingCallbackHandler(BaseCallbackHandler):
+    """Registra os passos do agente no logger, em vez de imprimir no stdout (verbose)."""
+    
+    def __init__(self):
+        self._logger = _get_step_logger()
+    
+    def on_agent_action(self, action, **kwargs) -> None:
+        self._logger.debug("Ferramenta %s chamada com: %s", action.tool, action.tool_input)
+    
+    def on_tool_end(self, output, **kwargs) -> None:
+        self._logger.debug("Resultado da ferramenta: %s", output)
+    
+    def on_agent_finish(self, finish, **kwargs) -> None:
+        self._logger.debug("Agente finalizado: %s", finish.return_values)
+
+
+class AgentManager:
+    """Gerencia a criação e configuração do agente."""
+    
+    def __init__(self):
+        self.site_knowledge = _get_site_knowledge()
+        self.tz = BRASIL_TZ
+        # Contexto local por número WhatsApp (limitado, descarta os menos recentes e inativos)
+        self.whatsapp_context = TTLCache(maxsize=_WHATSAPP_CONTEXT_SIZE, ttl=_WHATSAPP_CONTEXT_TTL)
+        self._attendee_cache = TTLCache(maxsize=_ATTENDEE_CACHE_SIZE, ttl=_ATTENDEE_CACHE_TTL)
+        # Uma busca por attendee de cada vez; as concorrentes aguardam a mesma requisição
+        self._attendee_inflight: Dict[Any, asyncio.Future] = {}
+
+    # Componentes do agente: construídos no primeiro uso (respostas rápidas não
+    # precisam deles), e a partir daí reaproveitados
+    @cached_property
+    def tools(self) -> List[BaseTool]:
+        return self._create_tools()
+
+    @cached_property
+    def prompt(self) -> ChatPromptTemplate:
+        return self._create_prompt()
+
+    @cached_property
+    def agent(self):
+        return self._create_agent()
+
+    @cached_property
+    def executor(self):
+        return self._create_executor()
+
+    @cached_property
+    def _run_config(self) -> Optional[Dict[str, Any]]:
+        """
+        Config de cada execução. Callbacks passados aqui (e não no construtor do
+        executor) são herdados pelas ferramentas, então on_tool_end também dispara.
+        """
+        return {"callbacks": [_LoggingCallbackHandler()]} if _AGENT_DEBUG else None
+
+    @cached_property
+    def _unwrap(self):
+        """Extração da resposta escolhida uma vez, conforme o formato do executor."""
+        return _unwrap_dict_output if self.executor.output_keys == ["output"] else _extract_output
+    
+    @property
+    def whatsapp_number(self) -> Optional[str]:
+        """Número do WhatsApp em atendimento na task atual."""
+        return current_whatsapp_number.get()
+    
+    def set_whatsapp_number(self, number: str) -> Optional[Dict[str, Any]]:
+        """
+        Define o número do WhatsApp atual e retorna a sessão local dele.
+        
+        O número fica vinculado à task atual (ContextVar), de onde as ferramentas
+        o leem; mensagens de números diferentes processadas ao mesmo tempo não se
+        sobrescrevem e nenhuma ferramenta compartilhada é alterada.
+        """
+        if not number:
+            logger.error("Tentativa de configurar número de WhatsApp vazio")
+            return None
+            
+        logger.info(f"Configurando número do WhatsApp no AgentManager: {number}")
+        current_whatsapp_number.set(number)
+        session = self.whatsapp_context.get(number)
+        if session is None:
+            session = {}
+        # Regravar renova a expiração enquanto o número estiver ativo
+        self.whatsapp_context[number] = session
+        return session
+    
+    async def get_user_context(self, email=None, whatsapp_number=None):
+        """
+        Busca informações contextuais do usuário baseado no email ou número de WhatsApp.
+        """
+        context = {}
+        
+        # Primeiro verificar contexto local
+        if whatsapp_number and whatsapp_number in self.whatsapp_context:
+            context.update(self.whatsapp_context[whatsapp_number])
+            
+            # Se já temos attendee_id, buscar informações atualizadas
+            attendee_id = context.get("attendee_id")
+            if attendee_id:
+                try:
+                    attendee = await self._get_attendee(attendee_id)
+                    if attendee:
+                        context["name"] = attendee.get("name")
+                        context["email"] = attendee.get("email")
+                        return context
+                except Exception as e:
+                    logger.error(f"Erro ao buscar attendee: {e}")
+        
+        return context
+
+    async def _get_attendee(self, attendee_id: Any) -> Optional[Dict[str, Any]]:
+        """Busca o attendee no Cal.com, usando o cache e agrupando buscas simultâneas."""
+        attendee = self._attendee_cache.get(attendee_id)
+        if attendee is not None:
+            return attendee
+        
+        inflight = self._attendee_inflight.get(attendee_id)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._load_attendee(attendee_id))
+            self._attendee_inflight[attendee_id] = inflight
+            inflight.add_done_callback(lambda done: self._attendee_inflight.pop(attendee_id, None))
+        # shield: o cancelamento de quem espera não cancela a busca compartilhada
+        return await asyncio.shield(inflight)
+    
+    async def _load_attendee(self, attendee_id: Any) -> Optional[Dict[str, Any]]:
+        """Busca o attendee no Cal.com e guarda no cache quando encontrado."""
+        attendee = await calendar_service.get_attendee(attendee_id)
+        if attendee:
+            self._attendee_cache[attendee_id] = attendee
+        return attendee
+
+    def _create_tools(self) -> List[BaseTool]:
+        """Cria as ferramentas disponíveis para o agente."""
+        return list(_build_tools())
+
+    def _create_prompt(self) -> ChatPromptTemplate:
+        """Retorna o template de prompt do agente (compartilhado, montado na importação)."""
+        return _AGENT_PROMPT
+
+    def _create_agent(self):
+        """
+        Cria o agente com tool calling nativo (permite várias ferramentas na mesma
+        resposta do modelo), reaproveitando um já construído para as mesmas ferramentas.
+        """
+        tools = self.tools
+        key = (tuple(tool.name for tool in tools), SYSTEM_PROMPT_HASH)
+        agent = _AGENT_CACHE.get(key)
+        if agent is None:
+            from langchain.agents import create_tool_calling_agent
+            
+            agent = create_tool_calling_agent(
+                llm_openai,
+                tools,
+                self.prompt
+            )
+            _AGENT_CACHE[key] = agent
+        return agent
+
+    def _create_executor(self) -> "AgentExecutor":
+        """Cria o executor do agente."""
+        from langchain.agents import AgentExecutor
+        
+        return AgentExecutor(
+            agent=self.agent,
+            tools=self.tools,
+            verbose=False,
+            # A maioria dos turnos é uma resposta direta ou uma ferramenta + resposta
+            max_iterations=4,
+            early_stopping_method="force",
+            handle_tool_error=True
+        )
+
+    async def initialize(self):
+        """Inicializa a base de conhecimento e a sessão HTTP do calendário."""
+        await calendar_service.start_session()
+        await self.site_knowledge.initialize()
+        
+    def _prepare_turn(self, message: str, phone_number: str, metadata: Optional[Dict]) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Prepara um turno: define o número atual e resolve atalhos.
+        
+        Returns:
+            Tupla (resposta imediata ou None, entradas do executor)
+        """
+        # Definir número atual
+        self.set_whatsapp_number(phone_number)
+        history = _prepare_history(metadata.get("history", "")) if metadata else ""
+        
+        # Atalho para cumprimentos e ruído, sem chamar o LLM
+        shortcut = _shortcut_reply(message, history)
+        if shortcut is not None:
+            logger.debug("Resposta por atalho para %s", phone_number)
+            return shortcut, {}
+        
+        # Data e hora atual, no minuto (mesmo texto para mensagens do mesmo minuto)
+        inputs = {
+            **_format_now(int(time.time()) // 60),
+            "input": message,
+            "history": history
+        }
+        return None, inputs
+        
+    async def run(self, message: str, phone_number: str, metadata: Dict = None):
+        """
+        Executa o agente para processar uma mensagem.
+        """
+        try:
+            reply, inputs = self._prepare_turn(message, phone_number, metadata)
+            if reply is not None:
+                return reply
+            
+            # Executar o agente
+            result = await self.executor.ainvoke(inputs, config=self._run_config)
+            
+            return _customer_reply(self._unwrap(result))
+            
+        except Exception as e:
+            logger.exception("Erro ao executar agente: %s", e)
+            return _ERROR_REPLY
+    
+    async def run_batch(
+        self,
+        items: List[Tuple[str, str, Optional[Dict]]],
+        max_concurrency: int = _BATCH_MAX_CONCURRENCY
+    ) -> List[str]:
+        """
+        Executa vários turnos (mensagem, número, metadata) em paralelo.
+        
+        Cada turno roda em sua própria task, com o número em seu próprio contexto,
+        limitado a `max_concurrency` chamadas simultâneas. As respostas seguem a
+        ordem de `items`; falhas viram a resposta de erro padrão, como em `run`.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run_one(message: str, phone_number: str, metadata: Optional[Dict]) -> str:
+            async with semaphore:
+                return await self.run(message, phone_number, metadata)
+        
+        return await asyncio.gather(*(run_one(*item) for item in items))
+    
+    async def run_stream(self, message: str, phone_number: str, metadata: Dict = None) -> AsyncIterator[str]:
+        """
+        Versão em streaming de `run`: emite a resposta parágrafo a parágrafo,
+        à medida que o modelo gera o texto, para o envio começar antes do fim.
+        """
+        try:
+            reply, inputs = self._prepare_turn(message, phone_number, metadata)
+            if reply is not None:
+                yield reply
+                return
+            
+            buffer = ""
+            streamed = False
+            final_output = None
+            async for event in self.executor.astream_events(inputs, config=self._run_config, version="v2"):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    buffer += event["data"]["chunk"].content or ""
+                    # Emitir cada parágrafo completo assim que ele termina
+                    while "\n\n" in buffer:
+                        paragraph, buffer = buffer.split("\n\n", 1)
+                        if paragraph.strip():
+                            streamed = True
+                            yield paragraph
+                elif kind == "on_tool_start":
+                    # Parágrafos já emitidos ficam enviados; só o trecho incompleto é
+                    # descartado. A resposta final vem depois da ferramenta: se ela tiver
+                    # return_direct, é o final_output que precisa ser emitido
+                    buffer = ""
+                    streamed = False
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    final_output = _customer_reply(self._unwrap(event["data"].get("output")))
+            
+            if buffer.strip():
+                yield buffer
+            elif not streamed and final_output:
+                # Ferramentas com return_direct não passam pelo modelo
+                yield final_output
+                
+        except Exception as e:
+            logger.exception("Erro ao executar agente em streaming: %s", e)
+            yield _ERROR_REPLY
+
+
 # Criar instância do AgentManager
-agent_manager = AgentManager()
+@lru_cache(maxsize=1)
+def get_agent_manager() -> AgentManager:
+    """Retorna o AgentManager do processo, construindo-o no primeiro uso."""
+    return AgentManager()
+
+
+# Atributos legados materializados sob demanda (PEP 562): importar o módulo
+# não constrói mais o agente, a base de conhecimento nem o executor
+_LAZY_EXPORTS = {
+    "agent_manager": lambda manager: manager,
+    "site_knowledge": lambda manager: manager.site_knowledge,
+    "agent_executor": lambda manager: manager.executor,
+}
+
+
+def __getattr__(name: str) -> Any:
+    factory = _LAZY_EXPORTS.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return factory(get_agent_manager())
 
-# Exportar as instâncias necessárias para outros módulos
-site_knowledge = agent_manager.site_knowledge
-agent_executor = agent_manager.executor
 
 # Exportar todos os símbolos necessários
-__all__ = ['agent_manager', 'site_knowledge', 'agent_executor']
\ No newline at end of file
+__all__ = ['get_agent_manager', 'agent_manager', 'site_knowledge', 'agent_executor']
@@ -1,20 +1,51 @@
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple, Type
 from datetime import datetime, timedelta
+from functools import lru_cache
+import heapq
 import logging
 import re
 import asyncio
 from zoneinfo import ZoneInfo
-import json
 
 from langchain.tools import BaseTool
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
-from services.calendar_service import calendar_service, CalendarServiceError
+from services.calendar_service import (
+    calendar_service, CalendarServiceError, CalendarSlotUnavailableError, WEEKDAYS_PT, BRASIL_TZ,
+    fromisoformat_z as _parse_iso_z,
+)
 from config import CALENDAR_CONFIG
-from services.context_manager import context_manager
+from services.context_manager import context_manager, current_whatsapp_number
 
 logger = logging.getLogger(__name__)
 
+# Ordem dos parâmetros posicionais aceitos pelas ferramentas
+_RESCHEDULE_PARAMS = ("booking_id", "new_start_time")
+
+# Validação dos dados de agendamento
+_EMAIL_RE = re.compile(r"[^@]+@[^@]+\.[^@]+")
+_GENERIC_NAMES = frozenset({"cliente", "customer", "user", "usuário", "lead"})
+_GENERIC_EMAILS = frozenset({"cliente@dominio.com", "email@dominio.com", "user@email.com"})
+
+# Datas relativas por extenso ("daqui 3 dias", "daqui 2 semanas")
+_IN_DAYS_RE = re.compile(r"daqui\s+(\d+)\s+dias")
+_IN_WEEKS_RE = re.compile(r"daqui\s+(\d+)\s+semanas")
+
+# Datas listadas na resposta de disponibilidade
+_AVAILABILITY_DATES_SHOWN = 7
+
+# Resposta quando o Cal.com recusa o horário por conflito
+_SLOT_UNAVAILABLE_REPLY = "Esse horário não está mais disponível. Por favor, escolha outro horário."
+
+# Palavras-chave aceitas como seletor no cancelamento/reagendamento
+_CONFIRM_WORDS = frozenset({"confirm", "confirmar", "true", "sim", "yes"})
+_CURRENT_BOOKING_WORDS = frozenset({"atual", "current"})
+_ORDINAL_WORDS = {
+    "primeiro": 1, "first": 1, "um": 1,
+    "segundo": 2, "second": 2, "dois": 2,
+    "terceiro": 3, "third": 3, "três": 3,
+}
+
 
 class AsyncTool(BaseTool):
     """Ferramenta que suporta apenas execução assíncrona."""
@@ -41,6 +72,21 @@ class CalendarScheduleArgs(BaseModel):
     phone: Optional[str] = Field(None, description="Número de telefone (opcional)")
     notes: Optional[str] = Field(None, description="Observações adicionais (opcional)")
 
+# Rótulos dos campos obrigatórios do agendamento, usados ao pedir dados faltantes
+_SCHEDULE_FIELD_LABELS = {"start_time": "data e hora", "name": "nome", "email": "email"}
+
+
+def _schedule_validation_error(error: ValidationError) -> str:
+    """Converte falhas de validação do calendar_schedule numa resposta para o agente."""
+    missing = [
+        _SCHEDULE_FIELD_LABELS[err["loc"][0]]
+        for err in error.errors()
+        if err["type"] == "missing" and err["loc"] and err["loc"][0] in _SCHEDULE_FIELD_LABELS
+    ]
+    if missing:
+        return f"Para agendar, preciso dos seguintes dados: {', '.join(missing)}"
+    return "Dados de agendamento inválidos. Informe data e hora (YYYY-MM-DDTHH:MM:SS), nome e email."
+
 class CalendarRescheduleArgs(BaseModel):
     booking_id: str = Field(..., description="ID da reserva a ser reagendada")
     new_start_time: str = Field(..., description="Nova data e hora no formato YYYY-MM-DDTHH:MM:SS")
@@ -49,6 +95,36 @@ class CalendarCancelArgs(BaseModel):
     booking_id: str = Field(..., description="ID da reserva a ser cancelada")
 
 
+def _naive_utc(dt: datetime) -> datetime:
+    """Datetime com fuso -> datetime sem fuso em UTC (offset fixo, sem consultar regras)."""
+    return dt.replace(tzinfo=None) - dt.utcoffset()
+
+
+def _format_day(date: str, day_slots: List[Dict[str, Any]], tz: ZoneInfo = BRASIL_TZ) -> str:
+    """Bloco de um dia da disponibilidade: data com dia da semana e um horário local por linha."""
+    date_obj = datetime.fromisoformat(date)
+    header = f"\n*{date_obj.strftime('%d/%m/%Y')} ({WEEKDAYS_PT[date_obj.weekday()]})*"
+    if not day_slots:
+        return header
+    # O deslocamento do fuso local é calculado uma vez por dia (São Paulo não tem
+    # mais horário de verão) e somado a cada horário, já normalizado para UTC ingênuo
+    utc_times = [_naive_utc(calendar_service.parse_iso_datetime(slot['time'])) for slot in day_slots]
+    offset = tz.utcoffset(utc_times[0])
+    return header + "".join(f"\n- {(utc + offset).strftime('%H:%M')}" for utc in utc_times)
+
+
+@lru_cache(maxsize=1024)
+def _fmt_local(iso_str: str, tz: ZoneInfo = BRASIL_TZ) -> str:
+    """
+    Formata um horário ISO 8601 (inclusive com sufixo 'Z') no fuso local,
+    como "dd/mm/aaaa às HH:MM". Horários sem fuso são considerados locais.
+    """
+    dt = _parse_iso_z(iso_str)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz)
+    return dt.astimezone(tz).strftime("%d/%m/%Y às %H:%M")
+
+
 # Classes base para ferramentas de calendário
 class BaseCalendarTool(AsyncTool):
     """Classe base para ferramentas de calendário."""
@@ -56,6 +132,8 @@ class BaseCalendarTool(AsyncTool):
     def __init__(self):
         """Inicializa a ferramenta de calendário."""
         super().__init__()
+        # Tipo de evento padrão, fixo durante a vida do serviço
+        self._default_event_type_id = calendar_service.default_event_type_id
     
     def _get_context_for_number(self, number: str) -> Dict[str, Any]:
         """Recupera contexto do Supabase para um número."""
@@ -65,8 +143,28 @@ class BaseCalendarTool(AsyncTool):
     
     @property
     def _current_number(self) -> Optional[str]:
-        """Retorna o número atual."""
-        return context_manager.get_current_number()
+        """Retorna o número em atendimento na task atual."""
+        return current_whatsapp_number.get() or context_manager.get_current_number()
+
+    @staticmethod
+    def _merge_call_args(resolved: Dict[str, Any], param_names: Tuple[str, ...], nested: Any) -> Dict[str, Any]:
+        """
+        Completa parâmetros ausentes com a estrutura aninhada em kwargs['args'].
+        
+        Aceita uma lista de argumentos posicionais ou um dicionário (solto ou como
+        primeiro item da lista). Valores já resolvidos têm prioridade.
+        """
+        match nested:
+            case [dict() as args_dict, *_] | (dict() as args_dict):
+                values = [args_dict.get(name) for name in param_names]
+            case [*values]:
+                pass
+            case _:
+                return resolved
+        
+        for name, value in zip(param_names, values):
+            resolved[name] = resolved.get(name) or value
+        return resolved
 
 
 class AsyncCalendarCheckTool(BaseCalendarTool):
@@ -74,8 +172,13 @@ class AsyncCalendarCheckTool(BaseCalendarTool):
     description: str = "Verificar horários disponíveis no calendário para próximos dias ou data específica"
     
     async def _arun(self, *args, **kwargs) -> str:
+        """Verifica a disponibilidade de horários (ver `_arun_stream`)."""
+        return "\n".join([chunk async for chunk in self._arun_stream(*args, **kwargs)])
+    
+    async def _arun_stream(self, *args, **kwargs) -> AsyncIterator[str]:
         """
-        Verifica a disponibilidade de horários.
+        Verifica a disponibilidade de horários, emitindo a resposta em blocos:
+        a introdução, um bloco por data e a pergunta final.
         
         Args:
             *args: Pode ser:
@@ -88,32 +191,24 @@ class AsyncCalendarCheckTool(BaseCalendarTool):
         try:
             # 1. Obter data atual e inicializar variáveis
             current_date = datetime.now().date()
-            logger.debug(f"Data atual: {current_date}")
-            days_ahead = 7  # Valor padrão
+            logger.debug("Data atual: %s", current_date)
             specific_date = None  # Nova variável para data específica
             
             # 2. Extrair parâmetros dos argumentos
             # Processar kwargs primeiro (tem prioridade)
-            if 'days_ahead' in kwargs:
-                days_ahead = kwargs['days_ahead']
+            days_ahead = kwargs.get('days_ahead', 7)
             if 'date' in kwargs:
                 specific_date = kwargs['date']
                 
-            # Processar args se kwargs não tiver o parâmetro necessário
-            elif len(args) > 0:
-                # Verificar se o primeiro arg é uma possível data
-                if isinstance(args[0], str) and ('/' in args[0] or '-' in args[0]):
-                    specific_date = args[0]
-                else:
+            # Processar args posicionais ou, por último, um 'args' passado como kwargs
+            else:
+                match args or kwargs.get('args'):
+                    # Primeiro arg com cara de data
+                    case [str() as first, *_] if '/' in first or '-' in first:
+                        specific_date = first
                     # Caso contrário, considerar como days_ahead
-                    days_ahead = args[0]
-                    
-            # Por último, processar um possível 'args' passado como kwargs
-            elif 'args' in kwargs and isinstance(kwargs['args'], (list, tuple)) and len(kwargs['args']) > 0:
-                if isinstance(kwargs['args'][0], str) and ('/' in kwargs['args'][0] or '-' in kwargs['args'][0]):
-                    specific_date = kwargs['args'][0]
-                else:
-                    days_ahead = kwargs['args'][0]
+                    case [first, *_]:
+                        days_ahead = first
             
             # 3. Corrigir ano da data se necessário
             if specific_date:
@@ -138,19 +233,20 @@ class AsyncCalendarCheckTool(BaseCalendarTool):
                                 date_parts[0] = str(current_date.year)
                                 specific_date = '-'.join(date_parts)
                             
-                        logger.debug(f"Data específica corrigida: {specific_date}")
+                        logger.debug("Data específica corrigida: %s", specific_date)
                     except Exception as e:
                         logger.warning(f"Não foi possível processar data: {specific_date} - {e}")
             
-            logger.debug(f"Verificando disponibilidade: date={specific_date}, days_ahead={days_ahead}")
+            logger.debug("Verificando disponibilidade: date=%s, days_ahead=%s", specific_date, days_ahead)
             try:
                 # Garantir que days_ahead seja um inteiro
                 if isinstance(days_ahead, str):
                     try:
                         days_ahead = int(days_ahead)
                     except ValueError:
-                        return ("Por favor, forneça um número válido de dias. "
-                                "Por exemplo: para ver os próximos 7 dias, use 'calendar_check(7)'")
+                        yield ("Por favor, forneça um número válido de dias. "
+                               "Por exemplo: para ver os próximos 7 dias, use 'calendar_check(7)'")
+                        return
                 
                 # Validar o range de dias
                 if days_ahead < 1:
@@ -188,66 +284,52 @@ class AsyncCalendarCheckTool(BaseCalendarTool):
                                 # Ajustar para o próximo ano
                                 start_date = start_date.replace(year=current_year + 1)
                             else:
-                                return "Não é possível agendar para datas passadas. Por favor, escolha uma data futura."
+                                yield "Não é possível agendar para datas passadas. Por favor, escolha uma data futura."
+                                return
                         
                         if not start_date:
-                            return "Formato de data inválido. Por favor, use formatos como '15/03/2025' ou '15/03'."
+                            yield "Formato de data inválido. Por favor, use formatos como '15/03/2025' ou '15/03'."
+                            return
                             
                     except Exception as e:
                         logger.error(f"Erro ao processar data: {e}")
-                        return "Não foi possível processar a data fornecida. Por favor, use um formato como '15/03/2025'."
+                        yield "Não foi possível processar a data fornecida. Por favor, use um formato como '15/03/2025'."
+                        return
                 
-                logger.debug(f"Buscando slots disponíveis para {days_ahead} dias a partir de {start_date or 'hoje'}")
+                logger.debug("Buscando slots disponíveis para %s dias a partir de %s", days_ahead, start_date or 'hoje')
                 
                 # Usar método do serviço de calendário com os parâmetros apropriados
-                slots = await calendar_service.get_availability(
+                slots = await calendar_service.get_availability_windowed(
                     days_ahead=days_ahead,
-                    start_date=start_date
+                    start_date=start_date,
+                    max_dates=_AVAILABILITY_DATES_SHOWN
                 )
                 
                 if not slots.get("slots"):
-                    return ("Não encontrei horários disponíveis para os próximos dias. "
-                        "Gostaria de verificar um período diferente?")
-                
+                    yield ("Não encontrei horários disponíveis para os próximos dias. "
+                       "Gostaria de verificar um período diferente?")
+                    return
                 
                 # Construir a resposta usando os slots organizados por data
-                response_parts = ["Encontrei os seguintes horários disponíveis:\n"]
+                yield "Encontrei os seguintes horários disponíveis:\n"
                 
-                for date, day_slots in sorted(slots["slots"].items())[:7]:  # Limita a 7 dias
-                    # Converter a data para datetime para formatação
-                    date_obj = datetime.strptime(date, "%Y-%m-%d")
-                    date_str = date_obj.strftime("%d/%m/%Y (%A)").replace("Monday", "Segunda-feira")\
-                                                                .replace("Tuesday", "Terça-feira")\
-                                                                .replace("Wednesday", "Quarta-feira")\
-                                                                .replace("Thursday", "Quinta-feira")\
-                                                                .replace("Friday", "Sexta-feira")\
-                                                                .replace("Saturday", "Sábado")\
-                                                                .replace("Sunday", "Domingo")
-                    
-                    response_parts.append(f"\n*{date_str}*")
-                    
-                    # Limitar a 5 slots por dia para não sobrecarregar
-                    for slot in day_slots:
-                        # Usar métodos utilitários do calendar_service para processar horários
-                        slot_time = calendar_service.parse_iso_datetime(slot["time"])
-                        local_time = calendar_service.convert_to_local(slot_time)
-                        # Usar duração padrão já que não vem da API
-                        response_parts.append(f"- {local_time.strftime('%H:%M')}")
+                # Só as primeiras datas: ordenação parcial (datas YYYY-MM-DD ordenam como texto)
+                for date, day_slots in heapq.nsmallest(_AVAILABILITY_DATES_SHOWN, slots["slots"].items()):
+                    yield _format_day(date, day_slots)
                 
-                response_parts.append("\nVocê gostaria de agendar em algum desses horários?")
-                return "\n".join(response_parts)
+                yield "\nVocê gostaria de agendar em algum desses horários?"
                     
             except CalendarServiceError as e:
                 logger.error(f"Erro ao verificar disponibilidade: {e}")
-                return ("Desculpe, estou com dificuldades para verificar os horários disponíveis no momento. "
-                    "Pode tentar novamente em alguns instantes?")
+                yield ("Desculpe, estou com dificuldades para verificar os horários disponíveis no momento. "
+                   "Pode tentar novamente em alguns instantes?")
                     
             except Exception as e:
                 logger.error(f"Erro inesperado ao verificar disponibilidade: {e}")
-                return "Desculpe, ocorreu um erro inesperado. Por favor, tente novamente."
+                yield "Desculpe, ocorreu um erro inesperado. Por favor, tente novamente."
         except Exception as e:
             logger.error(f"Erro inesperado ao verificar disponibilidade: {e}")
-            return "Desculpe, ocorreu um erro inesperado. Por favor, tente novamente."
+            yield "Desculpe, ocorreu um erro inesperado. Por favor, tente novamente."
 
     def _process_relative_date(self, message: str) -> Optional[str]:
         """
@@ -277,7 +359,7 @@ class AsyncCalendarCheckTool(BaseCalendarTool):
             
         elif "daqui" in message and "dias" in message:
             # Tentar extrair "daqui X dias"
-            match = re.search(r"daqui\s+(\d+)\s+dias", message)
+            match = _IN_DAYS_RE.search(message)
             if match:
                 days = int(match.group(1))
                 future_date = today + timedelta(days=days)
@@ -285,7 +367,7 @@ class AsyncCalendarCheckTool(BaseCalendarTool):
                 
         elif "daqui" in message and "semanas" in message:
             # Tentar extrair "daqui X semanas"
-            match = re.search(r"daqui\s+(\d+)\s+semanas", message)
+            match = _IN_WEEKS_RE.search(message)
             if match:
                 weeks = int(match.group(1))
                 future_date = today + timedelta(days=weeks*7)
@@ -298,52 +380,23 @@ class AsyncCalendarCheckTool(BaseCalendarTool):
 class AsyncCalendarScheduleTool(BaseCalendarTool):
     name: str = "calendar_schedule"
     description: str = "Agendar uma reunião no calendário"
+    # Argumentos validados pelo Pydantic antes da chamada; faltas viram uma resposta ao agente
+    args_schema: Type[BaseModel] = CalendarScheduleArgs
+    handle_validation_error: Any = _schedule_validation_error
     
-    async def _arun(self, *args, **kwargs) -> str:
+    async def _arun(
+        self,
+        start_time: str,
+        name: str,
+        email: str,
+        phone: Optional[str] = None,
+        notes: Optional[str] = None,
+        **kwargs
+    ) -> str:
         """Agenda uma nova reunião."""
-        # Log para depuração da estrutura completa de argumentos
-        logger.debug(f"Argumentos recebidos: args={args}, kwargs={kwargs}")
-        
-        # Extrair parâmetros dos argumentos (prioridade para kwargs)
-        start_time = kwargs.get('start_time')
-        name = kwargs.get('name')
-        email = kwargs.get('email')
-        phone = kwargs.get('phone')
-        notes = kwargs.get('notes')
-        
-        # Processar estrutura aninhada em 'args' (caso mais comum nas chamadas)
-        if 'args' in kwargs and isinstance(kwargs['args'], list):
-            args_list = kwargs['args']
-            # Se args for uma lista de argumentos posicionais
-            if len(args_list) >= 1 and isinstance(args_list[0], str):
-                start_time = start_time or args_list[0]
-            if len(args_list) >= 2 and isinstance(args_list[1], str):
-                name = name or args_list[1]
-            if len(args_list) >= 3 and isinstance(args_list[2], str):
-                email = email or args_list[2]
-            if len(args_list) >= 4 and isinstance(args_list[3], str):
-                phone = phone or args_list[3]
-            
-            # Se o primeiro item é um dicionário (menos comum)
-            elif len(args_list) > 0 and isinstance(args_list[0], dict):
-                args_dict = args_list[0]
-                start_time = start_time or args_dict.get('start_time')
-                name = name or args_dict.get('name')
-                email = email or args_dict.get('email')
-                phone = phone or args_dict.get('phone')
-                notes = notes or args_dict.get('notes')
-        
-        # Processar args posicionais diretamente (fallback)
-        if not all([start_time, name, email]) and len(args) >= 3:
-            start_time = start_time or args[0]
-            name = name or args[1]
-            email = email or args[2]
-            if len(args) >= 4:
-                phone = phone or args[3]
-            if len(args) >= 5:
-                notes = notes or args[4]
-        
-        logger.debug(f"Parâmetros extraídos: start_time={start_time}, name={name}, email={email}, phone={phone}")
+        logger.debug(
+            "Parâmetros extraídos: start_time=%s, name=%s, email=%s, phone=%s", start_time, name, email, phone
+        )
         
         try:
             # Validar parâmetros obrigatórios
@@ -354,34 +407,31 @@ class AsyncCalendarScheduleTool(BaseCalendarTool):
                 if not email: missing.append("email")
                 return f"Para agendar, preciso dos seguintes dados: {', '.join(missing)}"
     
-            # Verificar se os dados parecem ser valores padrão/genéricos
-            if name and email and (
-                name.lower() in ['cliente', 'customer', 'user', 'usuário', 'lead'] or
-                email.lower() in ['cliente@dominio.com', 'email@dominio.com', 'user@email.com']
-            ):
-                return ("Para agendar a reunião, preciso de dados específicos do cliente. "
-                        "Por favor, primeiro pergunte o nome completo e o email.")
-    
             # Validar formato do email
-            if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+            if not _EMAIL_RE.match(email):
                 return "Por favor, forneça um endereço de email válido."
     
             # Validar formato da data
             try:
-                start_datetime = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+                start_datetime = _parse_iso_z(start_time)
                 
                 # Verificar ano e corrigir se necessário
                 current_year = datetime.now().year
                 if start_datetime.year < current_year:
                     start_time = start_time.replace(str(start_datetime.year), str(current_year))
-                    start_datetime = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+                    start_datetime = _parse_iso_z(start_time)
                     logger.info(f"Corrigindo ano para atual: {start_time}")
             except ValueError:
                 return "Por favor, forneça uma data e hora válidas no formato YYYY-MM-DDTHH:MM:SS"
     
+            # Verificar se os dados parecem ser valores padrão/genéricos
+            if name.casefold() in _GENERIC_NAMES or email.casefold() in _GENERIC_EMAILS:
+                return ("Para agendar a reunião, preciso de dados específicos do cliente. "
+                        "Por favor, primeiro pergunte o nome completo e o email.")
+    
             # Agendar usando o serviço de calendário
             booking = await calendar_service.schedule_event(
-                event_type_id=calendar_service.default_event_type_id,
+                event_type_id=self._default_event_type_id,
                 start_time=start_datetime,
                 name=name,
                 email=email,
@@ -392,6 +442,7 @@ class AsyncCalendarScheduleTool(BaseCalendarTool):
             if not booking:
                 return "Desculpe, não foi possível realizar o agendamento. Por favor, tente outro horário."
             
+            
             # Extrair o ID do agendamento
             booking_id = booking.get("id")
             # IMPORTANTE: Criar o participante (attendee) e associá-lo à reunião
@@ -429,26 +480,24 @@ class AsyncCalendarScheduleTool(BaseCalendarTool):
                 
                 try:
                     # Salvar no Supabase via context_manager
-                    context_manager.update_context(current_number, booking_data)
+                    await asyncio.to_thread(context_manager.update_context, current_number, booking_data)
 
-                    # Verificação para confirmar o salvamento
-                    verification = context_manager.get_context(current_number)
-                    logger.info(f"VERIFICAÇÃO: booking_id salvo: {verification.get('booking_id')}")
+                    # Verificação para confirmar o salvamento (nova ida ao Supabase: só em debug)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        verification = await asyncio.to_thread(context_manager.get_context, current_number)
+                        logger.debug("VERIFICAÇÃO: booking_id salvo: %s", verification.get('booking_id'))
                 except Exception as e:
-                    logger.error(f"ERRO ao salvar dados de agendamento: {e}")
-                    import traceback
-                    logger.error(traceback.format_exc())
+                    logger.exception("ERRO ao salvar dados de agendamento: %s", e)
             
             # Buscar horário da reunião no objeto booking
-            start_time_str = booking.get("startTime")
-            if start_time_str:
-                start_datetime = datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
-            
-            local_time = start_datetime.astimezone(ZoneInfo("America/Sao_Paulo"))
+            local_time = _fmt_local(booking.get("startTime") or start_datetime.isoformat())
             
             # Retornar dados crus com prefixo especial em vez de JSON
-            return f"AGENDAMENTO_SUCESSO|{local_time.strftime('%d/%m/%Y às %H:%M')}|{email}|{booking_id}"
+            return f"AGENDAMENTO_SUCESSO|{local_time}|{email}|{booking_id}"
                 
+        except CalendarSlotUnavailableError as e:
+            logger.warning(f"Horário indisponível ao agendar: {e}")
+            return f"AGENDAMENTO_ERRO|{_SLOT_UNAVAILABLE_REPLY}"
         except CalendarServiceError as e:
             logger.error(f"Erro ao agendar reunião: {e}")
             return f"AGENDAMENTO_ERRO|{str(e)}"
@@ -476,67 +525,39 @@ class AsyncCalendarCancelTool(BaseCalendarTool):
             # Obter número específico de agendamento (1, 2, etc)
             booking_number = None
             
-            # Verificar args para possível número de agendamento ou confirmação
-            if args and len(args) > 0:
-                if isinstance(args[0], bool):
-                    confirm = args[0]
-                elif isinstance(args[0], (int, str)):
-                    try:
-                        booking_number = int(args[0])
-                    except (ValueError, TypeError):
-                        if isinstance(args[0], str) and args[0].lower() in ["confirm", "confirmar", "true", "sim", "yes"]:
-                            confirm = True
-                        elif isinstance(args[0], str) and args[0].lower() in ["atual", "atual", "current"]:
-                            # Se já solicitou confirmação para 'atual' anteriormente, considerar como confirmado
-                            if current_number and context_manager.get_context(current_number).get("pending_cancel_atual"):
-                                confirm = True
-                                # Limpar flag para evitar loop
-                                client_context = context_manager.get_context(current_number) or {}
-                                client_context["pending_cancel_atual"] = False
-                                context_manager.save_context(current_number, client_context)
-                            else:
-                                # Marcar que foi solicitado 'atual' para futuras chamadas
-                                if current_number:
-                                    client_context = context_manager.get_context(current_number) or {}
-                                    client_context["pending_cancel_atual"] = True
-                                    context_manager.save_context(current_number, client_context)
-                        elif args[0].lower() in ["1", "primeiro", "first", "um"]:
-                            booking_number = 1
-                        elif args[0].lower() in ["2", "segundo", "second", "dois"]:
-                            booking_number = 2
-                        elif args[0].lower() in ["3", "terceiro", "third", "três"]:
-                            booking_number = 3
-            
-            # Verificar 'args' no formato de array dentro de kwargs
-            if 'args' in kwargs and isinstance(kwargs['args'], (list, tuple)) and len(kwargs['args']) > 0:
-                if isinstance(kwargs['args'][0], bool):
-                    confirm = kwargs['args'][0]
-                elif isinstance(kwargs['args'][0], (int, str)):
-                    try:
-                        booking_number = int(kwargs['args'][0])
-                    except (ValueError, TypeError):
-                        if isinstance(kwargs['args'][0], str) and kwargs['args'][0].lower() in ["confirm", "confirmar", "true", "sim", "yes"]:
+            # Seletor recebido como primeiro argumento: 'args' aninhado em kwargs
+            # tem prioridade sobre os argumentos posicionais
+            match kwargs.get('args'):
+                case [selector, *_]:
+                    pass
+                case _:
+                    selector = args[0] if args else None
+            
+            # Verificar seletor para possível número de agendamento ou confirmação
+            match selector:
+                case bool():
+                    confirm = selector
+                case int():
+                    booking_number = selector
+                case str() if selector.strip().lstrip('-').isdigit():
+                    booking_number = int(selector)
+                case str():
+                    option = selector.lower()
+                    if option in _CONFIRM_WORDS:
+                        confirm = True
+                    elif option in _CURRENT_BOOKING_WORDS and current_number:
+                        client_context = await asyncio.to_thread(self._get_context_for_number, current_number)
+                        # Se já solicitou confirmação para 'atual' anteriormente, considerar como confirmado
+                        if client_context.get("pending_cancel_atual"):
                             confirm = True
-                        elif isinstance(kwargs['args'][0], str) and kwargs['args'][0].lower() in ["atual", "atual", "current"]:
-                            # Se já solicitou confirmação para 'atual' anteriormente, considerar como confirmado
-                            if current_number and context_manager.get_context(current_number).get("pending_cancel_atual"):
-                                confirm = True
-                                # Limpar flag para evitar loop
-                                client_context = context_manager.get_context(current_number) or {}
-                                client_context["pending_cancel_atual"] = False
-                                context_manager.save_context(current_number, client_context)
-                            else:
-                                # Marcar que foi solicitado 'atual' para futuras chamadas
-                                if current_number:
-                                    client_context = context_manager.get_context(current_number) or {}
-                                    client_context["pending_cancel_atual"] = True
-                                    context_manager.save_context(current_number, client_context)
-                        elif kwargs['args'][0].lower() in ["1", "primeiro", "first", "um"]:
-                            booking_number = 1
-                        elif kwargs['args'][0].lower() in ["2", "segundo", "second", "dois"]:
-                            booking_number = 2
-                        elif kwargs['args'][0].lower() in ["3", "terceiro", "third", "três"]:
-                            booking_number = 3
+                            # Limpar flag para evitar loop
+                            client_context["pending_cancel_atual"] = False
+                        else:
+                            # Marcar que foi solicitado 'atual' para futuras chamadas
+                            client_context["pending_cancel_atual"] = True
+                        await asyncio.to_thread(context_manager.save_context, current_number, client_context)
+                    elif option in _ORDINAL_WORDS:
+                        booking_number = _ORDINAL_WORDS[option]
             
             # Variáveis para armazenar informações
             booking_id = None
@@ -546,8 +567,8 @@ class AsyncCalendarCancelTool(BaseCalendarTool):
             # Inicializar contexto a partir do Supabase, se possível
             client_context = {}
             if current_number:
-                client_context = context_manager.get_context(current_number)
-                logger.debug(f"Contexto recuperado para {current_number}: {client_context}")
+                client_context = await asyncio.to_thread(context_manager.get_context, current_number)
+                logger.debug("Contexto recuperado para %s: %r", current_number, client_context)
                 
                 # Extrair informações do contexto
                 booking_id = client_context.get("booking_id")
@@ -580,11 +601,7 @@ class AsyncCalendarCancelTool(BaseCalendarTool):
                             booking_id = selected_booking.get("id")
                             
                             # Verificar se a solicitação foi feita com 'atual' explicitamente
-                            direct_atual = False
-                            if args and len(args) > 0 and isinstance(args[0], str) and args[0].lower() in ["atual", "current"]:
-                                direct_atual = True
-                            elif 'args' in kwargs and isinstance(kwargs['args'], (list, tuple)) and len(kwargs['args']) > 0 and isinstance(kwargs['args'][0], str) and kwargs['args'][0].lower() in ["atual", "current"]:
-                                direct_atual = True
+                            direct_atual = isinstance(selector, str) and selector.lower() in _CURRENT_BOOKING_WORDS
                             
                             # Se é uma solicitação direta com 'atual', cancelar imediatamente sem confirmação
                             if direct_atual and not confirm:
@@ -630,7 +647,7 @@ class AsyncCalendarCancelTool(BaseCalendarTool):
                         # Salvar booking_id no contexto para uso futuro
                         if current_number:
                             client_context["booking_id"] = booking.get("id")
-                            context_manager.save_context(current_number, client_context)
+                            await asyncio.to_thread(context_manager.save_context, current_number, client_context)
                         
                         booking_id = booking.get("id")  # Salvar para uso posterior
                         
@@ -642,16 +659,16 @@ class AsyncCalendarCancelTool(BaseCalendarTool):
                         if current_number:
                             for i, booking in enumerate(bookings, 1):
                                 client_context[f"booking_id_{i}"] = booking.get("id")
-                            context_manager.save_context(current_number, client_context)
+                            await asyncio.to_thread(context_manager.save_context, current_number, client_context)
                         
-                        message = "Você tem os seguintes agendamentos:\n\n"
-                        for i, booking in enumerate(bookings, 1):
-                            start_time = self._format_date_time(booking.get("startTime"))
-                            title = booking.get("title", "Demonstração Nerai")
-                            message += f"{i}. {title} - {start_time}\n"
-                        
-                        message += "\nPara cancelar um agendamento, use 'calendar_cancel(1)' ou 'calendar_cancel(\"primeiro\")'"
-                        return message
+                        formatted = [
+                            (booking.get("title", "Demonstração Nerai"), self._format_date_time(booking.get("startTime")))
+                            for booking in bookings
+                        ]
+                        parts = ["Você tem os seguintes agendamentos:\n"]
+                        parts.extend(f"{i}. {title} - {start_time}" for i, (title, start_time) in enumerate(formatted, 1))
+                        parts.append("\nPara cancelar um agendamento, use 'calendar_cancel(1)' ou 'calendar_cancel(\"primeiro\")'")
+                        return "\n".join(parts)
                 
                 # Processamento da solicitação de cancelamento
                 selected_booking = None
@@ -679,7 +696,7 @@ class AsyncCalendarCancelTool(BaseCalendarTool):
                     # Salvar este booking_id para futuras referências
                     if current_number:
                         client_context["booking_id"] = booking_id
-                        context_manager.save_context(current_number, client_context)
+                        await asyncio.to_thread(context_manager.save_context, current_number, client_context)
                 
                 # Se ainda não encontramos o agendamento
                 if not selected_booking:
@@ -698,7 +715,7 @@ class AsyncCalendarCancelTool(BaseCalendarTool):
                     # Salvar o booking_id para quando a confirmação vier
                     if current_number:
                         client_context["pending_cancel_booking_id"] = booking_id
-                        context_manager.save_context(current_number, client_context)
+                        await asyncio.to_thread(context_manager.save_context, current_number, client_context)
                     
                     return f"CANCELAMENTO_CONFIRMAR|{start_time}|{title}"
                 
@@ -712,12 +729,13 @@ class AsyncCalendarCancelTool(BaseCalendarTool):
                 result = await calendar_service.cancel_booking(booking_id)
                 
                 if result:
+                    
                     # Limpar dados de agendamento do contexto se tivermos o current_number
                     if current_number:
                         for key in list(client_context.keys()):
                             if "booking_id" in key:
                                 del client_context[key]
-                        context_manager.save_context(current_number, client_context)
+                        await asyncio.to_thread(context_manager.save_context, current_number, client_context)
                             
                     # Retornar mensagem de sucesso
                     return f"CANCELAMENTO_SUCESSO|{start_time}|{title}"
@@ -730,8 +748,7 @@ class AsyncCalendarCancelTool(BaseCalendarTool):
             logger.error(f"Erro ao cancelar agendamento: {e}")
             return f"CANCELAMENTO_ERRO|{str(e)}"
         except Exception as e:
-            logger.error(f"Erro inesperado ao cancelar agendamento: {e}")
-            logger.error(f"Detalhes: {str(e)}")
+            logger.exception("Erro inesperado ao cancelar agendamento: %s", e)
             return "CANCELAMENTO_ERRO|Ocorreu um erro inesperado ao cancelar agendamento"
     
     def _format_date_time(self, timestamp: Optional[str]) -> str:
@@ -740,9 +757,7 @@ class AsyncCalendarCancelTool(BaseCalendarTool):
             return "Data não especificada"
         
         try:
-            # Usar métodos utilitários do calendar_service
-            dt = calendar_service.parse_iso_datetime(timestamp)
-            return calendar_service.format_datetime_human(dt)
+            return _fmt_local(timestamp)
         except Exception as e:
             logger.error(f"Erro ao formatar data/hora: {e}")
             return "Data/hora inválida"
@@ -788,26 +803,14 @@ class AsyncCalendarRescheduleTool(BaseCalendarTool):
         new_start_time = None
         
         try:
-            # Prioridade para kwargs
-            if 'booking_id' in kwargs:
-                booking_id = kwargs['booking_id']
-            if 'new_start_time' in kwargs:
-                new_start_time = kwargs['new_start_time']
-            
-            # Processar estrutura aninhada em 'args' (caso mais comum nas chamadas)
-            if 'args' in kwargs and isinstance(kwargs['args'], list):
-                args_list = kwargs['args']
-                # Se args for uma lista de argumentos posicionais
-                if len(args_list) >= 1 and isinstance(args_list[0], str):
-                    booking_id = booking_id or args_list[0]
-                if len(args_list) >= 2 and isinstance(args_list[1], str):
-                    new_start_time = new_start_time or args_list[1]
-                    
-                # Se o primeiro item é um dicionário (menos comum)
-                elif len(args_list) > 0 and isinstance(args_list[0], dict):
-                    args_dict = args_list[0]
-                    booking_id = booking_id or args_dict.get('booking_id')
-                    new_start_time = new_start_time or args_dict.get('new_start_time')
+            # Prioridade para kwargs; depois a estrutura aninhada em 'args' (caso mais comum)
+            params = self._merge_call_args(
+                {'booking_id': kwargs.get('booking_id'), 'new_start_time': kwargs.get('new_start_time')},
+                _RESCHEDULE_PARAMS,
+                kwargs.get('args')
+            )
+            booking_id = params['booking_id']
+            new_start_time = params['new_start_time']
             
             # Depois args posicionais (fallback)
             if booking_id is None and len(args) > 0:
@@ -822,7 +825,7 @@ class AsyncCalendarRescheduleTool(BaseCalendarTool):
             current_number = self._current_number
 
             # Verificar se booking_id é a palavra-chave "atual"
-            if isinstance(booking_id, str) and booking_id.lower() in ["atual", "atual", "current"]:
+            if isinstance(booking_id, str) and booking_id.lower() in _CURRENT_BOOKING_WORDS:
                 logger.info("Reagendando o agendamento mais recente")
                 # Buscar os agendamentos mais recentes
                 try:
@@ -853,7 +856,7 @@ class AsyncCalendarRescheduleTool(BaseCalendarTool):
 
             # Se booking_id não foi fornecido, tentar pegar do contexto
             if not booking_id and current_number:
-                client_context = self._get_context_for_number(current_number)
+                client_context = await asyncio.to_thread(self._get_context_for_number, current_number)
                 booking_id = client_context.get("booking_id")
             
             if not booking_id:
@@ -864,12 +867,11 @@ class AsyncCalendarRescheduleTool(BaseCalendarTool):
                 # Tentar formato ISO primeiro
                 new_datetime = calendar_service.parse_iso_datetime(new_start_time)
                 # Garantir que está no fuso horário local
-                brasil_tz = ZoneInfo("America/Sao_Paulo")
                 if new_datetime.tzinfo is None:
-                    new_datetime = new_datetime.replace(tzinfo=brasil_tz)
+                    new_datetime = new_datetime.replace(tzinfo=BRASIL_TZ)
                 else:
                     # Se já tem timezone, converter para local
-                    new_datetime = new_datetime.astimezone(brasil_tz)
+                    new_datetime = new_datetime.astimezone(BRASIL_TZ)
                 
                 # Log para debug
                 logger.info(f"Horário local após conversão: {new_datetime}")
@@ -878,8 +880,7 @@ class AsyncCalendarRescheduleTool(BaseCalendarTool):
                     # Tentar formato YYYY-MM-DD HH:MM
                     new_datetime = datetime.strptime(new_start_time, "%Y-%m-%d %H:%M")
                     # Garantir que está no fuso horário local
-                    brasil_tz = ZoneInfo("America/Sao_Paulo")
-                    new_datetime = new_datetime.replace(tzinfo=brasil_tz)
+                    new_datetime = new_datetime.replace(tzinfo=BRASIL_TZ)
                     # Log para debug
                     logger.info(f"Horário local após conversão: {new_datetime}")
                 except ValueError:
@@ -902,6 +903,9 @@ class AsyncCalendarRescheduleTool(BaseCalendarTool):
             
             return response
                 
+        except CalendarSlotUnavailableError as e:
+            logger.warning(f"Horário indisponível ao reagendar: {e}")
+            return f"REAGENDAMENTO_ERRO|{_SLOT_UNAVAILABLE_REPLY}"
         except CalendarServiceError as e:
             logger.error(f"Erro ao reagendar: {e}")
             return f"REAGENDAMENTO_ERRO|{str(e)}"
@@ -7,7 +7,8 @@ from typing import Dict, List, Any, Optional
 import asyncio
 from langchain.tools import BaseTool
 
-from utils.smart_message_processor import send_reaction_to_message
+from services.context_manager import current_whatsapp_number
+from utils.smart_message_processor import send_in_background, send_reaction_to_message
 
 logger = logging.getLogger(__name__)
 
@@ -85,7 +86,7 @@ class ReactionTool(BaseTool):
         self._last_message_id = None
         
     def set_whatsapp_number(self, number: str) -> None:
-        """Define o número do WhatsApp para envio."""
+        """Define o número padrão, usado fora de uma task com número em atendimento."""
         if not number:
             logger.error("Tentativa de configurar número de WhatsApp vazio na ferramenta de reação")
             return
@@ -94,6 +95,11 @@ class ReactionTool(BaseTool):
         self._whatsapp_number = number
         logger.info(f"Número de WhatsApp configurado na ferramenta de reação: '{number}' (anterior: '{old_number}')")
     
+    @property
+    def _current_number(self) -> Optional[str]:
+        """Retorna o número em atendimento na task atual."""
+        return current_whatsapp_number.get() or self._whatsapp_number
+    
     def set_last_message_id(self, message_id: str) -> None:
         """Define o ID da última mensagem recebida."""
         self._last_message_id = message_id
@@ -165,7 +171,8 @@ class ReactionTool(BaseTool):
         """
         try:
             # Verificar número do WhatsApp
-            if not self._whatsapp_number:
+            whatsapp_number = self._current_number
+            if not whatsapp_number:
                 logger.error("Número do WhatsApp não configurado na ferramenta de reação")
                 return "Erro: Número do WhatsApp não configurado. Por favor, aguarde o cliente enviar uma mensagem primeiro."
                 
@@ -203,21 +210,21 @@ class ReactionTool(BaseTool):
                 
             # Logs detalhados antes de enviar
             logger.info(f"Reagindo à mensagem {msg_id} com '{reaction_emoji}'")
-            logger.info(f"Usando número de WhatsApp: {self._whatsapp_number}")
+            logger.info(f"Usando número de WhatsApp: {whatsapp_number}")
             
-            # Enviar a reação
-            success = await send_reaction_to_message(msg_id, reaction_emoji, self._whatsapp_number)
+            # Enviar a reação em segundo plano, sem segurar a resposta em texto
+            send_in_background(
+                send_reaction_to_message(msg_id, reaction_emoji, whatsapp_number),
+                f"reação {reaction_emoji} à mensagem {msg_id}"
+            )
             
             # Se tiver uma mensagem de follow-up, retorna ela
             if follow_up:
                 logger.info(f"Retornando mensagem de follow-up após reação: '{follow_up[:30]}...'")
                 return follow_up.strip()
                 
-            if success:
-                # Retornar espaço em branco em vez de string vazia para evitar erro de resposta inválida
-                return " "
-            else:
-                return "Erro ao reagir à mensagem. Tente novamente."
+            # Retornar espaço em branco em vez de string vazia para evitar erro de resposta inválida
+            return " "
                 
         except Exception as e:
             logger.error(f"Erro ao enviar reação: {e}")
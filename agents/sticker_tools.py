@@ -7,7 +7,8 @@ from typing import Dict, List, Any, Optional
 import asyncio
 from langchain.tools import BaseTool
 
-from utils.smart_message_processor import send_sticker_to_user
+from services.context_manager import current_whatsapp_number
+from utils.smart_message_processor import send_in_background, send_sticker_to_user
 
 logger = logging.getLogger(__name__)
 
@@ -44,9 +45,14 @@ class StickerTool(BaseTool):
         self._whatsapp_number = None
         
     def set_whatsapp_number(self, number: str) -> None:
-        """Define o número do WhatsApp para envio."""
+        """Define o número padrão, usado fora de uma task com número em atendimento."""
         self._whatsapp_number = number
     
+    @property
+    def _current_number(self) -> Optional[str]:
+        """Retorna o número em atendimento na task atual."""
+        return current_whatsapp_number.get() or self._whatsapp_number
+    
     def _run(self, sticker_name: str = None, sticker_url: str = None) -> str:
         """
         Não usar diretamente, usar o método async.
@@ -73,7 +79,8 @@ class StickerTool(BaseTool):
             String com a mensagem de follow-up se fornecida, ou espaço em branco em caso de sucesso
         """
         try:
-            if not self._whatsapp_number:
+            whatsapp_number = self._current_number
+            if not whatsapp_number:
                 logger.error("Número do WhatsApp não configurado")
                 return "Erro: Número do WhatsApp não configurado"
             
@@ -95,19 +102,16 @@ class StickerTool(BaseTool):
             
             logger.info(f"Enviando figurinha: {url}")
             
-            # Enviar a figurinha
-            success = await send_sticker_to_user(url, self._whatsapp_number)
+            # Enviar a figurinha em segundo plano, sem segurar a resposta em texto
+            send_in_background(send_sticker_to_user(url, whatsapp_number), f"figurinha para {whatsapp_number}")
             
             # Se tiver uma mensagem de follow-up, retorna ela
             if follow_up:
                 logger.info(f"Retornando mensagem de follow-up após figurinha: '{follow_up[:30]}...'")
                 return follow_up.strip()
             
-            if success:
-                # Retornar espaço em branco em vez de string vazia para evitar erro de resposta inválida
-                return " "
-            else:
-                return "Erro ao enviar figurinha. Tente novamente."
+            # Retornar espaço em branco em vez de string vazia para evitar erro de resposta inválida
+            return " "
                 
         except Exception as e:
             logger.error(f"Erro ao enviar figurinha: {e}")
@@ -9,10 +9,11 @@ import asyncio
 from typing import Dict, List, Optional, Any
 from quart import Quart, request, jsonify
 
-from agents.agent_setup import agent_manager  # Modificado para usar agent_manager
+from agents.agent_setup import get_agent_manager
+from services.calendar_service import calendar_service
 from services.audio_processing import handle_audio_message
 from utils.message_buffer import handle_message_with_buffer, message_buffer, update_presence  # Modificada importação
-from utils.smart_message_processor import send_message_in_chunks
+from utils.smart_message_processor import send_message_in_chunks, wait_background_sends
 from utils.conversation_manager import conversation_manager
 
 
@@ -45,12 +46,18 @@ PROCESSED_LEADS = set()
 async def startup():
     """Inicializa o agente e a base de conhecimento antes de servir requisições."""
     try:
-        await agent_manager.initialize()
+        await get_agent_manager().initialize()
         logger.info("Agente e base de conhecimento inicializados com sucesso!")
     except Exception as e:
         logger.error(f"Erro na inicialização: {str(e)}", exc_info=True)
         raise
 
+@app.after_serving
+async def shutdown():
+    """Aguarda figurinhas e reações ainda sendo enviadas e fecha a sessão do calendário."""
+    await wait_background_sends()
+    await calendar_service.close()
+
 @app.route('/webhook', methods=['POST'])
 async def webhook():
     try:
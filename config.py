@@ -216,4 +216,7 @@ CALENDAR_CONFIG = config_manager.calendar_config
 
 # Exporta configurações do Supabase
 SUPABASE_CONFIG = config_manager.supabase_config
-SUPABASE_CLIENT = create_client(SUPABASE_CONFIG.url, SUPABASE_CONFIG.key)
\ No newline at end of file
+SUPABASE_CLIENT = create_client(SUPABASE_CONFIG.url, SUPABASE_CONFIG.key)
+
+# Redis opcional para cache compartilhado entre processos (vazio = só cache em memória)
+REDIS_URL = os.getenv("REDIS_URL", "")
@@ -1,6 +1,10 @@
+import asyncio
 import os
+import threading
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Optional, List, Any, Dict
 from dataclasses import dataclass, field
 from enum import Enum
@@ -13,6 +17,8 @@ from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 from langchain_huggingface import HuggingFaceEmbeddings
 
+from utils.cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 # Remover STAGES do enum
@@ -25,8 +31,19 @@ UPDATE_INTERVAL = 86400  # 1 dia em segundos
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 250
 DEFAULT_RESULTS = 3
+QUERY_CACHE_SIZE = 1024  # consultas recentes guardadas em memória
+QUERY_ERROR_REPLY = "Erro ao consultar a base de conhecimento."
+QUERY_MAX_WORKERS = 4  # buscas (embedding + FAISS) simultâneas fora do event loop
 SITE_URL = "https://nerai.com.br"
 
+@lru_cache(maxsize=1)
+def _query_executor() -> ThreadPoolExecutor:
+    """
+    Pool próprio para as buscas na base: separado do executor padrão do loop,
+    usado pelas chamadas ao Supabase, para que uma não enfileire atrás da outra.
+    """
+    return ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS, thread_name_prefix="site-knowledge")
+
 @dataclass
 class KnowledgeBaseConfig:
     """Configuração para a base de conhecimento."""
@@ -73,6 +90,10 @@ class SiteKnowledge:
         self.last_updates: Dict[KnowledgeSource, Optional[float]] = {
             KnowledgeSource.WEBSITE: None
         }
+        # Respostas de consultas recentes, por pergunta normalizada. O TTLCache não é
+        # thread-safe e é usado pelo event loop e pelas threads do pool: sempre sob o lock
+        self._query_cache = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=self.config.update_interval)
+        self._query_cache_lock = threading.Lock()
         self.embeddings = HuggingFaceEmbeddings(
             model_name="intfloat/multilingual-e5-large",
             model_kwargs={
@@ -100,6 +121,8 @@ class SiteKnowledge:
         """Inicializa todas as bases de conhecimento."""
         try:
             logger.info("Inicializando bases de conhecimento...")
+            with self._query_cache_lock:
+                self._query_cache.clear()
             for source in KnowledgeSource:
                 self.vectorstores[source] = await self.load_knowledge_base(source)
                 if not self.vectorstores[source] or self.needs_update(source):
@@ -217,8 +240,40 @@ class SiteKnowledge:
             logger.error(f"Erro ao carregar base {source.value}: {str(e)}")
             return None
 
+    @staticmethod
+    def _cache_key(question: str, source: Optional[KnowledgeSource], k: int) -> tuple:
+        """Chave do cache de consultas: pergunta normalizada, fonte e quantidade."""
+        return (" ".join(question.lower().split()), source, k)
+
+    async def aquery(self, question: str, source: Optional[KnowledgeSource] = None, k: int = DEFAULT_RESULTS) -> str:
+        """
+        Versão assíncrona de `query`: acertos no cache retornam direto; a busca
+        (embedding + FAISS, ligada à CPU) roda no pool da base, fora do event loop.
+        """
+        with self._query_cache_lock:
+            cached = self._query_cache.get(self._cache_key(question, source, k))
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_query_executor(), self.query, question, source, k)
+
     def query(self, question: str, source: Optional[KnowledgeSource] = None, k: int = DEFAULT_RESULTS) -> str:
-        """Consulta uma ou todas as bases de conhecimento."""
+        """Consulta uma ou todas as bases de conhecimento (com cache por pergunta normalizada)."""
+        cache_key = self._cache_key(question, source, k)
+        with self._query_cache_lock:
+            cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        response = self._query(question, source, k)
+        # Só guarda respostas de bases carregadas e consultas sem erro
+        if response != QUERY_ERROR_REPLY and any(self.vectorstores.values()):
+            with self._query_cache_lock:
+                self._query_cache[cache_key] = response
+        return response
+
+    def _query(self, question: str, source: Optional[KnowledgeSource], k: int) -> str:
+        """Executa a busca por similaridade nas bases de conhecimento."""
         try:
             if source:
                 if not self.vectorstores[source]:
@@ -236,7 +291,7 @@ class SiteKnowledge:
             
         except Exception as e:
             logger.error(f"Erro na consulta: {str(e)}")
-            return "Erro ao consultar a base de conhecimento."
+            return QUERY_ERROR_REPLY
 
     def _format_response(self, docs: List[Document]) -> str:
         """Formata a resposta com informações sobre a fonte."""
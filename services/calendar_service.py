@@ -1,11 +1,17 @@
 import asyncio
-import json
 import aiohttp
+import orjson
 import logging
+import math
+import sys
+from bisect import bisect_left
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Dict, List, Optional, Union, Any
 from zoneinfo import ZoneInfo
-from config import CALENDAR_CONFIG
+from config import CALENDAR_CONFIG, REDIS_URL
+from utils.cache import TTLCache
 import time
 
 # Reduzir logs das requisições HTTP
@@ -13,10 +19,84 @@ logging.getLogger('aiohttp').setLevel(logging.ERROR)
 
 logger = logging.getLogger(__name__)
 
+# Fuso horário local, assumido para datas sem fuso
+BRASIL_TZ = ZoneInfo("America/Sao_Paulo")
+
+# Pool de conexões compartilhado pelas ferramentas de calendário
+HTTP_POOL_LIMIT = 20
+HTTP_KEEPALIVE_TIMEOUT = 60  # segundos
+HTTP_DNS_CACHE_TTL = 300  # segundos
+# Máximo de requisições simultâneas ao Cal.com (ferramentas em paralelo + janelas)
+HTTP_MAX_CONCURRENCY = 8
+
+# Disponibilidades consultadas recentemente, descartadas a cada alteração na agenda
+AVAILABILITY_CACHE_SIZE = 32
+AVAILABILITY_CACHE_TTL = 45  # segundos
+# Com REDIS_URL, as disponibilidades ficam só no Redis, compartilhadas entre processos
+AVAILABILITY_REDIS_PREFIX = "nerai:cache:calendar:avail:"
+# Versão das chaves: incrementada a cada alteração na agenda (as antigas expiram pelo TTL)
+AVAILABILITY_REDIS_GENERATION_KEY = f"{AVAILABILITY_REDIS_PREFIX}generation"
+REDIS_SOCKET_TIMEOUT = 1  # segundos: o Redis é só cache, não pode segurar a resposta
+AVAILABILITY_LOCK_TIMEOUT = 30  # segundos: validade do lock de renovação
+AVAILABILITY_LOCK_WAIT = 5  # segundos: espera máxima pelo lock antes de consultar mesmo assim
+# Períodos longos são consultados em janelas desse tamanho, em paralelo
+AVAILABILITY_WINDOW_DAYS = 7
+# Dias corridos por dia útil (agenda de segunda a sexta): folga para os fins de semana
+AVAILABILITY_CALENDAR_DAYS_PER_WORKDAY = 7 / 5
+
+# Nomes dos dias da semana, na ordem de date.weekday()
+WEEKDAYS_PT = (
+    "Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira",
+    "Sexta-feira", "Sábado", "Domingo",
+)
+
+# Horários distintos de slots lembrados já convertidos em datetime
+ISO_PARSE_CACHE_SIZE = 2048
+
+# Trechos das respostas de erro do Cal.com que indicam horário já ocupado
+SLOT_CONFLICT_MARKERS = (
+    "(409)",
+    "no_available_users_found_error",
+    "booking_time_out_of_bounds",
+    "already has booking",
+)
+
 class CalendarServiceError(Exception):
     """Exceção personalizada para erros do serviço de calendário."""
     pass
 
+class CalendarSlotUnavailableError(CalendarServiceError):
+    """O horário solicitado não está (mais) disponível no Cal.com."""
+    pass
+
+def _is_slot_conflict(error_msg: str) -> bool:
+    """Indica se o erro do Cal.com corresponde a um conflito de horário."""
+    return any(marker in error_msg for marker in SLOT_CONFLICT_MARKERS)
+
+# fromisoformat aceitando o sufixo 'Z' (UTC) do Cal.com: nativo a partir do Python 3.11
+if sys.version_info >= (3, 11):
+    fromisoformat_z = datetime.fromisoformat
+else:
+    def fromisoformat_z(iso_string: str) -> datetime:
+        """fromisoformat com o sufixo 'Z' trocado só quando está no fim."""
+        if iso_string.endswith("Z"):
+            iso_string = iso_string[:-1] + "+00:00"
+        return datetime.fromisoformat(iso_string)
+
+def _orjson_dumps(obj: Any) -> str:
+    """Serializador JSON da sessão aiohttp (orjson gera bytes; a sessão espera str)."""
+    return orjson.dumps(obj).decode()
+
+@lru_cache(maxsize=ISO_PARSE_CACHE_SIZE)
+def _parse_iso(iso_string: str) -> datetime:
+    """fromisoformat com sufixo 'Z' e fuso do Brasil para datas sem fuso (resultado imutável, cacheável)."""
+    dt = fromisoformat_z(iso_string)
+    
+    # Se não tem timezone, assume que é o timezone local (Brasil)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=BRASIL_TZ)
+    return dt
+
 class CalendarService:
     def __init__(self):
         """
@@ -28,6 +108,11 @@ class CalendarService:
         self.time_zone = CALENDAR_CONFIG.time_zone
         self.username = "agencia-nerai"  # Username do Cal.com
         self._session = None
+        self._request_semaphore = asyncio.Semaphore(HTTP_MAX_CONCURRENCY)
+        self._availability_cache = TTLCache(maxsize=AVAILABILITY_CACHE_SIZE, ttl=AVAILABILITY_CACHE_TTL)
+        self._availability_inflight: Dict[tuple, asyncio.Future] = {}
+        self._availability_generation = 0  # incrementado a cada invalidação
+        self._redis = None  # cliente criado no primeiro uso, se REDIS_URL estiver definido
         
         # Headers padrão para todas as requisições
         self.headers = {
@@ -43,8 +128,7 @@ class CalendarService:
         Returns:
             datetime: Data e hora atual no fuso horário America/Sao_Paulo
         """
-        brasil_tz = ZoneInfo("America/Sao_Paulo")
-        return datetime.now(brasil_tz)
+        return datetime.now(BRASIL_TZ)
     
     def format_date_human(self, dt: Optional[datetime] = None, format_str: str = "%d/%m/%Y") -> str:
         """
@@ -76,8 +160,7 @@ class CalendarService:
         """
         # Se não tem timezone, assume que é o timezone local (Brasil)
         if dt.tzinfo is None:
-            brasil_tz = ZoneInfo("America/Sao_Paulo")
-            dt = dt.replace(tzinfo=brasil_tz)
+            dt = dt.replace(tzinfo=BRASIL_TZ)
             
         # Converte para UTC
         return dt.astimezone(timezone.utc)
@@ -97,8 +180,7 @@ class CalendarService:
             dt = dt.replace(tzinfo=timezone.utc)
             
         # Converte para o fuso horário local
-        brasil_tz = ZoneInfo("America/Sao_Paulo")
-        return dt.astimezone(brasil_tz)
+        return dt.astimezone(BRASIL_TZ)
     
     def parse_iso_datetime(self, iso_string: str) -> datetime:
         """
@@ -110,15 +192,8 @@ class CalendarService:
         Returns:
             Objeto datetime com timezone
         """
-        # Tentar converter para datetime
-        dt = datetime.fromisoformat(iso_string)
-        
-        # Se não tem timezone, assume que é o timezone local (Brasil)
-        if dt.tzinfo is None:
-            brasil_tz = ZoneInfo("America/Sao_Paulo")
-            dt = dt.replace(tzinfo=brasil_tz)
-            
-        return dt
+        # Os mesmos horários se repetem entre consultas: conversão memorizada
+        return _parse_iso(iso_string)
     
     def format_datetime_to_iso(self, dt: datetime) -> str:
         """
@@ -132,8 +207,7 @@ class CalendarService:
         """
         # Garantir que tem timezone
         if dt.tzinfo is None:
-            brasil_tz = ZoneInfo("America/Sao_Paulo")
-            dt = dt.replace(tzinfo=brasil_tz)
+            dt = dt.replace(tzinfo=BRASIL_TZ)
             
         # Formatar no padrão ISO com Z para UTC
         return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
@@ -156,16 +230,37 @@ class CalendarService:
         return local_dt.strftime(format_str)
     
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Retorna uma sessão HTTP existente ou cria uma nova."""
+        """
+        Retorna uma sessão HTTP existente ou cria uma nova.
+        
+        A sessão é única no processo: todas as ferramentas de calendário passam
+        por `calendar_service`, reaproveitando as mesmas conexões keep-alive.
+        """
         if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession(headers=self.headers)
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL
+            )
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=connector,
+                json_serialize=_orjson_dumps
+            )
         return self._session
     
+    async def start_session(self) -> None:
+        """Abre a sessão HTTP na inicialização da aplicação, no event loop que a servirá."""
+        await self._get_session()
+    
     async def close(self):
-        """Fecha a sessão HTTP quando não for mais necessária."""
+        """Fecha a sessão HTTP (e o cliente Redis, se houver) quando não for mais necessária."""
         if self._session and not self._session.closed:
             await self._session.close()
             self._session = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
     
     async def _request(self, 
                     method: str, 
@@ -193,7 +288,7 @@ class CalendarService:
         logger.debug(f"Requisição Cal.com: {method} {url}")
         
         try:
-            async with session.request(
+            async with self._request_semaphore, session.request(
                 method=method,
                 url=url,
                 params=params,
@@ -209,8 +304,9 @@ class CalendarService:
                 # Alguns endpoints retornam string vazia em caso de sucesso (ex: DELETE)
                 if not response_text:
                     return {}
-                    
-                return await response.json()
+                
+                # O corpo já foi lido: decodificar o texto em vez de ler de novo com response.json()
+                return orjson.loads(response_text)
                 
         except aiohttp.ClientError as e:
             logger.error(f"Erro de conexão com Cal.com: {e}")
@@ -241,6 +337,188 @@ class CalendarService:
         """
         event_type_id = event_type_id or self.default_event_type_id
         
+        cache_key = (str(event_type_id), start_date, days_ahead)
+        if self._uses_memory_cache:
+            # Reaproveitar consulta recente com os mesmos parâmetros
+            cached = self._availability_cache.get(cache_key)
+            if cached is not None:
+                logger.debug(f"Disponibilidade em cache para {cache_key}")
+                return cached
+            
+            # "Próximos N dias" pode sair de uma consulta recente de um período maior
+            if start_date is None:
+                cached = self._cached_superset(str(event_type_id), days_ahead)
+                if cached is not None:
+                    return cached
+        
+        # Consultas simultâneas com os mesmos parâmetros aguardam a mesma requisição
+        inflight = self._availability_inflight.get(cache_key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._load_availability(cache_key, event_type_id, start_date, days_ahead))
+            self._availability_inflight[cache_key] = inflight
+            # Só remove a própria entrada: após uma invalidação a chave pode já ter outra consulta
+            inflight.add_done_callback(
+                lambda done: self._availability_inflight.get(cache_key) is done
+                and self._availability_inflight.pop(cache_key, None)
+            )
+        else:
+            logger.debug(f"Aguardando consulta em andamento para {cache_key}")
+        # shield: o cancelamento de quem espera não cancela a consulta compartilhada
+        return await asyncio.shield(inflight)
+    
+    @property
+    def _uses_memory_cache(self) -> bool:
+        """
+        Cache em memória só sem Redis: as invalidações de outros processos chegam
+        apenas pelo Redis, e o cache local ofereceria horários já ocupados até expirar.
+        """
+        return self._get_redis() is None
+    
+    def _cached_superset(self, event_type_id: str, days_ahead: int) -> Optional[Dict]:
+        """
+        Recorta, de uma consulta "a partir de agora" ainda em cache que cubra mais
+        dias, só os horários entre agora e `days_ahead` dias à frente.
+        """
+        for key in self._availability_cache:
+            cached_type, cached_start, cached_days = key
+            # Período estritamente maior: a margem cobre o tempo desde a consulta (TTL curto)
+            if cached_type != event_type_id or cached_start is not None or cached_days <= days_ahead:
+                continue
+            superset = self._availability_cache.get(key)
+            if superset is None:
+                continue
+            
+            now = datetime.now(timezone.utc)
+            end = now + timedelta(days=days_ahead)
+            slot_time = lambda slot: self.parse_iso_datetime(slot["time"])
+            slots: Dict[str, List[Dict]] = {}
+            for date, day_slots in superset.get("slots", {}).items():
+                # Slots do dia vêm em ordem: busca binária pelas bordas do período
+                start_idx = bisect_left(day_slots, now, key=slot_time)
+                end_idx = bisect_left(day_slots, end, lo=start_idx, key=slot_time)
+                if start_idx < end_idx:
+                    slots[date] = day_slots[start_idx:end_idx]
+            logger.debug(f"Disponibilidade de {days_ahead} dias recortada da consulta de {cached_days} dias")
+            return {"slots": slots}
+        return None
+    
+    async def _load_availability(self,
+                                 cache_key: tuple,
+                                 event_type_id: Union[int, str],
+                                 start_date: Optional[datetime],
+                                 days_ahead: int) -> Dict:
+        """Consulta a disponibilidade (Redis ou Cal.com) e grava nos caches; estrutura vazia em caso de erro."""
+        generation = self._availability_generation
+        redis_key = await self._availability_redis_key(cache_key)
+        try:
+            shared = await self._redis_get(redis_key)
+            if shared is None:
+                # Um processo renova a chave por vez; os demais aguardam e leem do Redis
+                async with self._refresh_lock(redis_key):
+                    shared = await self._redis_get(redis_key)
+                    if shared is None:
+                        result = await self._fetch_availability(event_type_id, start_date, days_ahead)
+                        if generation == self._availability_generation:
+                            await self._redis_set(redis_key, result)
+            if shared is not None:
+                result = shared
+        except Exception as e:
+            logger.error(f"Erro ao buscar disponibilidade: {e}")
+            # Retornar estrutura vazia em caso de erro
+            return {"slots": {}}
+        # Não gravar resultado anterior a uma alteração na agenda feita durante a consulta
+        if self._uses_memory_cache and generation == self._availability_generation:
+            self._availability_cache[cache_key] = result
+        return result
+    
+    # === CACHE COMPARTILHADO (REDIS, OPCIONAL) ===
+    
+    def _get_redis(self):
+        """Retorna o cliente Redis assíncrono, ou None quando REDIS_URL não está definido."""
+        if not REDIS_URL:
+            return None
+        if self._redis is None:
+            try:
+                import redis.asyncio as redis_asyncio
+            except ImportError:
+                logger.warning("REDIS_URL definido, mas o pacote redis não está instalado")
+                return None
+            self._redis = redis_asyncio.from_url(
+                REDIS_URL,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+            )
+        return self._redis
+    
+    async def _availability_redis_key(self, cache_key: tuple) -> Optional[str]:
+        """Chave da disponibilidade na versão atual, ou None sem Redis (ou com o Redis fora)."""
+        client = self._get_redis()
+        if client is None:
+            return None
+        try:
+            generation = await client.get(AVAILABILITY_REDIS_GENERATION_KEY)
+        except Exception as e:
+            logger.warning(f"Redis indisponível ao ler a versão das disponibilidades: {e}")
+            return None
+        event_type_id, start_date, days_ahead = cache_key
+        start = start_date.isoformat() if start_date else "now"
+        version = int(generation) if generation is not None else 0
+        return f"{AVAILABILITY_REDIS_PREFIX}v{version}:{event_type_id}:{start}:{days_ahead}"
+    
+    async def _redis_get(self, redis_key: Optional[str]) -> Optional[Dict]:
+        """Lê uma disponibilidade do Redis; falhas do Redis contam como ausência."""
+        if redis_key is None:
+            return None
+        try:
+            raw = await self._get_redis().get(redis_key)
+        except Exception as e:
+            logger.warning(f"Redis indisponível ao ler {redis_key}: {e}")
+            return None
+        return orjson.loads(raw) if raw is not None else None
+    
+    async def _redis_set(self, redis_key: Optional[str], value: Dict) -> None:
+        """Grava uma disponibilidade no Redis com o mesmo TTL do cache em memória."""
+        if redis_key is None:
+            return
+        try:
+            await self._get_redis().set(redis_key, orjson.dumps(value), ex=AVAILABILITY_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Redis indisponível ao gravar {redis_key}: {e}")
+    
+    @asynccontextmanager
+    async def _refresh_lock(self, redis_key: Optional[str]):
+        """
+        Lock distribuído de renovação da chave (evita que vários processos consultem
+        o Cal.com ao mesmo tempo quando ela expira). Sem Redis, ou se o lock não vier
+        a tempo, segue sem ele.
+        """
+        if redis_key is None:
+            yield
+            return
+        lock = self._get_redis().lock(
+            f"{redis_key}:lock",
+            timeout=AVAILABILITY_LOCK_TIMEOUT,
+            blocking_timeout=AVAILABILITY_LOCK_WAIT
+        )
+        try:
+            acquired = await lock.acquire()
+        except Exception as e:
+            logger.warning(f"Não foi possível obter o lock {redis_key}: {e}")
+            acquired = False
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except Exception as e:
+                    logger.warning(f"Erro ao liberar o lock {redis_key}: {e}")
+    
+    async def _fetch_availability(self,
+                                  event_type_id: Union[int, str],
+                                  start_date: Optional[datetime],
+                                  days_ahead: int) -> Dict:
+        """Consulta os slots no Cal.com, sem cache."""
         # Se não foi fornecida uma data inicial, usar data atual
         if not start_date:
             start_date = datetime.now(timezone.utc)
@@ -265,21 +543,85 @@ class CalendarService:
         
         logger.debug(f"Consultando slots de {start_time_str} até {end_time_str}")
         
-        try:
-            # Buscar slots disponíveis
-            result = await self._request(
-                "GET",
-                "slots",
-                params=params
+        # Buscar slots disponíveis
+        result = await self._request(
+            "GET",
+            "slots",
+            params=params
+        )
+        
+        logger.info(f"Slots disponíveis obtidos para event_type_id={event_type_id}")
+        return result
+    
+    async def get_availability_windowed(self,
+                                        event_type_id: Optional[Union[int, str]] = None,
+                                        start_date: Optional[datetime] = None,
+                                        days_ahead: int = 7,
+                                        window_days: int = AVAILABILITY_WINDOW_DAYS,
+                                        max_dates: Optional[int] = None) -> Dict:
+        """
+        Como `get_availability`, mas percorre períodos longos em janelas de
+        `window_days` dias, juntando os slots por data.
+        
+        As janelas são consultadas em paralelo, em lotes: sem `max_dates`, todas de uma
+        vez; com `max_dates`, o primeiro lote já cobre `max_dates` dias úteis mais os
+        fins de semana, e só se ainda faltarem datas com horários o próximo é buscado.
+        """
+        if days_ahead <= window_days:
+            return await self.get_availability(event_type_id, start_date, days_ahead)
+        
+        # Janelas seguintes começam à meia-noite, para chaves de cache estáveis no dia
+        base_day = (start_date or datetime.now(timezone.utc)).replace(hour=0, minute=0, second=0, microsecond=0)
+        offsets = list(range(0, days_ahead, window_days))
+        if max_dates is None:
+            batch_size = len(offsets)
+        else:
+            span_days = math.ceil(max_dates * AVAILABILITY_CALENDAR_DAYS_PER_WORKDAY)
+            batch_size = max(1, math.ceil(span_days / window_days))
+        
+        def fetch_window(offset: int):
+            if offset == 0:
+                return self.get_availability(event_type_id, start_date, window_days)
+            return self.get_availability(
+                event_type_id,
+                base_day + timedelta(days=offset),
+                min(window_days, days_ahead - offset)
             )
-            
-            logger.info(f"Slots disponíveis obtidos para event_type_id={event_type_id}")
-            return result
-            
+        
+        merged: Dict[str, Dict[str, Dict]] = {}
+        for batch_start in range(0, len(offsets), batch_size):
+            batch = offsets[batch_start:batch_start + batch_size]
+            results = await asyncio.gather(*(fetch_window(offset) for offset in batch))
+            
+            # Juntar por data, sem repetir horários nas bordas das janelas
+            for result in results:
+                for date, day_slots in result.get("slots", {}).items():
+                    date_slots = merged.setdefault(date, {})
+                    for slot in day_slots:
+                        date_slots.setdefault(slot.get("time"), slot)
+            
+            if max_dates is not None and sum(1 for date_slots in merged.values() if date_slots) >= max_dates:
+                break
+        return {"slots": {date: list(date_slots.values()) for date, date_slots in merged.items()}}
+    
+    async def invalidate_availability(self) -> None:
+        """
+        Descarta as disponibilidades em cache (chamado após qualquer alteração na agenda).
+        
+        Nunca lança exceção: a alteração já foi feita no Cal.com, e uma falha do Redis
+        não pode transformá-la em erro para o cliente.
+        """
+        self._availability_generation += 1
+        self._availability_cache.clear()
+        self._availability_inflight.clear()
+        
+        try:
+            client = self._get_redis()
+            if client is not None:
+                # Nova versão das chaves: as anteriores deixam de ser lidas e expiram sozinhas
+                await client.incr(AVAILABILITY_REDIS_GENERATION_KEY)
         except Exception as e:
-            logger.error(f"Erro ao buscar disponibilidade: {e}")
-            # Retornar estrutura vazia em caso de erro
-            return {"slots": {}}
+            logger.warning(f"Redis indisponível ao invalidar disponibilidades: {e}")
     
     # === CRIAÇÃO DE AGENDAMENTO ===
     
@@ -330,12 +672,11 @@ class CalendarService:
         
         try:
             # Log do payload para debug
-            logger.debug(f"Payload de agendamento: {json.dumps(payload, indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Payload de agendamento: %s", orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode())
             
             # Fazer requisição para criar o agendamento
             booking = await self._request("POST", "bookings", json_data=payload)
-            logger.info(f"Agendamento criado com sucesso: {booking.get('id')}")
-            return booking
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Erro ao criar agendamento: {error_msg}")
@@ -353,8 +694,16 @@ class CalendarService:
                 logger.error("2. Se o usuário 'agencia-nerai' está associado a este tipo de evento")
                 logger.error("3. Se o usuário tem disponibilidade configurada para este horário")
             
+            # Conflito de horário: o Cal.com recusa a reserva no próprio POST
+            if _is_slot_conflict(error_msg):
+                raise CalendarSlotUnavailableError(f"Horário indisponível: {error_msg}")
+            
             # Repassar o erro original para tratamento adequado
             raise CalendarServiceError(f"Falha ao criar agendamento: {error_msg}")
+        
+        await self.invalidate_availability()
+        logger.info(f"Agendamento criado com sucesso: {booking.get('id')}")
+        return booking
     
     # === GERENCIAMENTO DE PARTICIPANTES ===
     
@@ -516,11 +865,13 @@ class CalendarService:
                 }
             )
             
-            logger.info(f"Agendamento {booking_id} cancelado com sucesso")
-            return True
         except Exception as e:
             logger.error(f"Erro ao cancelar agendamento {booking_id}: {e}")
             return False
+        
+        await self.invalidate_availability()
+        logger.info(f"Agendamento {booking_id} cancelado com sucesso")
+        return True
     
     async def reschedule_booking(self, 
                                booking_id: Union[int, str], 
@@ -541,8 +892,7 @@ class CalendarService:
             
             # Garantir que o horário está no fuso horário local
             if new_start_time.tzinfo is None:
-                brasil_tz = ZoneInfo("America/Sao_Paulo")
-                new_start_time = new_start_time.replace(tzinfo=brasil_tz)
+                new_start_time = new_start_time.replace(tzinfo=BRASIL_TZ)
             
             # Log do horário local
             logger.info(f"Horário local para reagendamento: {new_start_time}")
@@ -577,13 +927,16 @@ class CalendarService:
                 json_data=payload
             )
             
-            # Log do horário local para verificação
-            logger.info(f"Agendamento {booking_id} reagendado para {new_start_time}")
-            return result
-            
         except Exception as e:
             logger.error(f"Erro ao reagendar agendamento {booking_id}: {e}")
+            if _is_slot_conflict(str(e)):
+                raise CalendarSlotUnavailableError(f"Horário indisponível: {str(e)}")
             raise CalendarServiceError(f"Falha ao reagendar: {str(e)}")
+        
+        await self.invalidate_availability()
+        # Log do horário local para verificação
+        logger.info(f"Agendamento {booking_id} reagendado para {new_start_time}")
+        return result
     
     
     def format_availability_response(self, slots_data: Dict, tz_name: str = "America/Sao_Paulo") -> str:
@@ -600,37 +953,21 @@ class CalendarService:
         if not slots_data.get("slots"):
             return "Não há horários disponíveis no período solicitado."
         
-        tz = ZoneInfo(tz_name)
-        message_parts = ["Horários disponíveis:"]
-        
-        weekday_translation = {
-            "Monday": "Segunda-feira",
-            "Tuesday": "Terça-feira",
-            "Wednesday": "Quarta-feira",
-            "Thursday": "Quinta-feira",
-            "Friday": "Sexta-feira",
-            "Saturday": "Sábado",
-            "Sunday": "Domingo"
-        }
+        return "\n".join(self._iter_availability_lines(slots_data["slots"], ZoneInfo(tz_name)))
+    
+    def _iter_availability_lines(self, slots_by_date: Dict[str, List[Dict]], tz: ZoneInfo):
+        """Gera as linhas da mensagem de disponibilidade: cabeçalho, datas e horários locais."""
+        yield "Horários disponíveis:"
         
-        for date, slots in sorted(slots_data["slots"].items()):
+        for date, slots in sorted(slots_by_date.items()):
             # Converter data para formato local
             date_obj = datetime.strptime(date, "%Y-%m-%d")
-            weekday = date_obj.strftime("%A")
-            local_date = f"{date_obj.strftime('%d/%m/%Y')} ({weekday_translation.get(weekday, weekday)})"
-            
-            message_parts.append(f"\n📅 {local_date}")
+            yield f"\n📅 {date_obj.strftime('%d/%m/%Y')} ({WEEKDAYS_PT[date_obj.weekday()]})"
             
+            # Converter horários para local
             for slot in slots:
-                # Converter horário para local
-                slot_time = slot.get("time", "")
-                if slot_time:
-                    slot_time_obj = self.parse_iso_datetime(slot_time)
-                    local_time = self.convert_to_local(slot_time_obj)
-                    
-                    message_parts.append(f"⏰ {local_time.strftime('%H:%M')}")
-        
-        return "\n".join(message_parts)
+                if slot_time := slot.get("time"):
+                    yield f"⏰ {self.parse_iso_datetime(slot_time).astimezone(tz).strftime('%H:%M')}"
 
 # Instância global do serviço
 calendar_service = CalendarService()
\ No newline at end of file
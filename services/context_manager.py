@@ -1,6 +1,7 @@
 import logging
 import traceback
 import threading
+from contextvars import ContextVar
 from typing import Dict, Any, Optional
 from datetime import datetime
 
@@ -10,6 +11,10 @@ logging.getLogger('httpcore.http2').setLevel(logging.ERROR)
 
 logger = logging.getLogger(__name__)
 
+# Número do WhatsApp em atendimento na task atual.
+# O asyncio copia o contexto por task, então atendimentos simultâneos não se misturam.
+current_whatsapp_number: ContextVar[Optional[str]] = ContextVar("current_whatsapp_number", default=None)
+
 class SupabaseContextManager:
     """
     Gerencia o contexto das conversas com persistência no Supabase.
@@ -2,6 +2,7 @@ import logging
 from typing import Optional, Dict, Any
 from dataclasses import dataclass
 
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_groq import ChatGroq
 from langchain_anthropic import ChatAnthropic
@@ -20,6 +21,9 @@ class LLMConfig:
 class OpenAIConfig(LLMConfig):
     """Configuração específica para OpenAI."""
     model: str = OPENAI_MODEL
+    # Pool HTTP/2 compartilhado entre todas as chamadas concorrentes
+    max_connections: int = 32
+    max_keepalive_connections: int = 16
     
 @dataclass
 class GroqConfig(LLMConfig):
@@ -56,6 +60,20 @@ class LLMManager:
         self._llm_groq: Optional[ChatGroq] = None
         self._llm_claude: Optional[ChatAnthropic] = None
         
+    def _create_openai_http_client(self) -> httpx.AsyncClient:
+        """
+        Cliente HTTP/2 único para as chamadas assíncronas à OpenAI: turnos
+        concorrentes multiplexam a mesma conexão TLS em vez de abrir novas.
+        """
+        return httpx.AsyncClient(
+            http2=True,
+            timeout=self.openai_config.request_timeout,
+            limits=httpx.Limits(
+                max_connections=self.openai_config.max_connections,
+                max_keepalive_connections=self.openai_config.max_keepalive_connections
+            )
+        )
+    
     @property
     def llm_openai(self) -> ChatOpenAI:
         """Instância singleton do modelo OpenAI."""
@@ -66,7 +84,8 @@ class LLMManager:
                     model=self.openai_config.model,
                     temperature=self.openai_config.temperature,
                     max_retries=self.openai_config.max_retries,
-                    request_timeout=self.openai_config.request_timeout
+                    request_timeout=self.openai_config.request_timeout,
+                    http_async_client=self._create_openai_http_client()
                 )
             except Exception as e:
                 logger.error(f"Erro ao inicializar OpenAI: {e}")
@@ -15,6 +15,9 @@ logging.getLogger('aiohttp').setLevel(logging.ERROR)
 
 logger = logging.getLogger(__name__)
 
+_NON_DIGITS_RE = re.compile(r"\D")
+_WHATSAPP_NUMBER_RE = re.compile(r"^\d{12,13}$")
+
 class MessageType(Enum):
     """Tipos de mensagens suportados."""
     TEXT = "text"
@@ -206,7 +209,7 @@ class WhatsAppClient:
         - "55DDNNNNNNNNN@c.us" (algumas APIs precisam deste formato)
         """
         # Remove todos os caracteres não numéricos
-        number = re.sub(r"\D", "", number)
+        number = _NON_DIGITS_RE.sub("", number)
         
         # Adiciona o código do país se necessário
         if not number.startswith(self.config.default_country_code) and 10 <= len(number) <= 11:
@@ -222,7 +225,7 @@ class WhatsAppClient:
     def validate_number(self, number: str) -> bool:
         """Valida formato do número."""
         formatted = self._format_number(number)
-        return bool(re.match(r'^\d{12,13}$', formatted))
+        return bool(_WHATSAPP_NUMBER_RE.match(formatted))
 
     async def close(self):
         """Fecha a sessão HTTP."""
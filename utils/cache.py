@@ -0,0 +1,77 @@
+#cache.py
+"""
+Cache em memória com limite de itens e expiração opcional por tempo.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Dicionário limitado a `maxsize` itens, descartando o menos usado recentemente.
+    Se `ttl` for definido, cada item expira `ttl` segundos após ser gravado.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - stored_at >= self.ttl
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retorna o valor da chave (ou `default` se ausente/expirado)."""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        if self._expired(item[0]):
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return item[1]
+
+    def setdefault(self, key: Hashable, default: Any = None) -> Any:
+        """Retorna o valor da chave, gravando `default` se ausente/expirado."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            self[key] = value = default
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove a chave e retorna seu valor (ou `default`)."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        del self._data[key]
+        return value
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self._data[key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -4,7 +4,7 @@ import asyncio
 import logging
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, field
-from agents.agent_setup import agent_executor, agent_manager
+from agents.agent_setup import get_agent_manager
 from utils.smart_message_processor import send_message_in_chunks
 from utils.conversation_manager import conversation_manager  # Adicionado import
 
@@ -15,6 +15,8 @@ logger = logging.getLogger(__name__)
 
 # Dicionário global para armazenar o status de presença e últimas atividades
 presence_status: Dict[str, Dict[str, Any]] = {}
+# Status em que o usuário ainda está escrevendo/gravando
+_BUSY_STATUSES = frozenset({"composing", "recording"})
 
 def update_presence(number: str, presence_data: Dict[str, Any]) -> None:
     """
@@ -56,7 +58,7 @@ async def is_user_available(number: str) -> bool:
         if time.time() - last_update > 5:
             return True
             
-        return current_status not in ["composing", "recording"]
+        return current_status not in _BUSY_STATUSES
     except Exception as e:
         logger.error(f"Erro ao verificar disponibilidade: {e}")
         return True
@@ -188,37 +190,44 @@ class MessageBuffer:
         try:
             self.add_to_history(number, "user", message)
             
-            # Obter o histórico do conversation_manager
-            history = conversation_manager.get_history(number)
+            # Obter o histórico do conversation_manager (consulta síncrona ao Supabase,
+            # executada fora do event loop)
+            history = await asyncio.to_thread(conversation_manager.get_history, number)
             
             # Configurar o número do WhatsApp no AgentManager
+            agent_manager = get_agent_manager()
             agent_manager.set_whatsapp_number(number)
             logger.info(f"Número WhatsApp configurado no AgentManager: {number}")
             
-            # Usar o método run do agent_manager que é mais seguro
-            # pois encapsula as chamadas corretas ao executor
+            # Consumir a resposta do agente em streaming: o primeiro parágrafo
+            # respeita a verificação de presença e os demais seguem em sequência
             logger.info(f"Chamando o agente para processar mensagem para número: {number}")
-            response = await agent_manager.run(
+            paragraphs = []
+            success = True
+            async for paragraph in agent_manager.run_stream(
                 message=message,
                 phone_number=number,
                 metadata={"history": history} if history else None
-            )
+            ):
+                if not paragraph.strip():
+                    # Simplesmente registrar sem enviar mensagem para espaços em branco
+                    logger.debug("Resposta vazia ou somente espaços, não enviando mensagem")
+                    continue
+                
+                if paragraphs:
+                    sent = await send_message_in_chunks(paragraph, number)
+                else:
+                    sent = await send_message_with_presence_check(paragraph, number)
+                success = success and sent
+                paragraphs.append(paragraph)
             
-            # Garantir que a resposta é uma string válida
-            if not isinstance(response, str):
-                logger.warning(f"Resposta inválida do agente: {response}")
-                response = "Desculpe, ocorreu um erro. Tente novamente."
-            elif response.strip() == "":
-                # Simplesmente registrar sem enviar mensagem para espaços em branco
-                logger.debug("Resposta vazia ou somente espaços, não enviando mensagem")
+            if not paragraphs:
                 return True
-                
-            logger.debug(f"Resposta processada: {response[:100]}...")
             
+            response = "\n\n".join(paragraphs)
+            logger.debug(f"Resposta processada: {response[:100]}...")
             self.add_to_history(number, "assistant", response)
-            
-            # Usa o sistema de verificação de presença para enviar a resposta
-            return await send_message_with_presence_check(response, number)
+            return success
             
         except Exception as e:
             logger.error(f"Erro no processamento: {e}")
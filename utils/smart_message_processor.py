@@ -3,7 +3,7 @@ import random
 import asyncio
 import logging
 import os
-from typing import List, Optional
+from typing import Awaitable, List, Optional, Set
 from dataclasses import dataclass
 
 from services.whatsapp_client import WhatsAppClient, create_whatsapp_client
@@ -192,6 +192,32 @@ whatsapp_client = create_whatsapp_client(
 
 message_processor = SmartMessageProcessor(whatsapp_client)
 
+# Envios em segundo plano ainda em andamento (a referência evita que a task seja coletada)
+_background_sends: Set[asyncio.Task] = set()
+
+def _on_background_send_done(task: asyncio.Task, description: str) -> None:
+    """Registra falhas de um envio em segundo plano."""
+    _background_sends.discard(task)
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.error(f"Erro no envio em segundo plano ({description}): {error}")
+    elif not task.result():
+        logger.error(f"Falha no envio em segundo plano ({description})")
+
+def send_in_background(send: Awaitable[bool], description: str) -> asyncio.Task:
+    """Agenda um envio sem aguardar o resultado; falhas são apenas registradas no log."""
+    task = asyncio.ensure_future(send)
+    _background_sends.add(task)
+    task.add_done_callback(lambda done: _on_background_send_done(done, description))
+    return task
+
+async def wait_background_sends() -> None:
+    """Aguarda os envios em segundo plano pendentes (ex.: antes de encerrar o processo)."""
+    if _background_sends:
+        await asyncio.gather(*list(_background_sends), return_exceptions=True)
+
 # Funções de interface para manter compatibilidade
 async def send_message_in_chunks(text: str, number: str) -> bool:
     """Função de interface para envio de mensagens."""